@@ -0,0 +1,204 @@
+import asyncio
+import ccxt.async_support as ccxt_async
+from apis.event_loop import run_sync, get_loop
+from apis.market_cache import MarketCache
+from apis.price_service import PriceService
+from apis.rate_limit import AsyncRateLimiter
+from apis.reconciler import OrderReconciler
+from metrics import metrics
+
+
+"""
+Executes buying on an exchange with ccxt.async_support
+Every request goes through the exchange's AsyncRateLimiter and the pooled aiohttp session of the ccxt exchange
+Orders are handed to an OrderReconciler which fills in the fills and fees in the background
+Exchanges override the class attributes and the few methods that differ (step size, order type, order polling)
+"""
+class async_exchange_api:
+
+	name = None
+	key_fields = {'api_key':'apiKey', 'secret_key':'secret'}
+	check_minimum = True
+
+	# Initialize
+	def __init__(self, api_keys, max_concurrent=5):
+		self.exchange = self.make_exchange(api_keys)
+
+		# The limiter replaces ccxt's own throttle
+		self.exchange.enableRateLimit = False
+		self.limiter = AsyncRateLimiter(max_concurrent, 1000 / max(self.exchange.rateLimit, 1))
+		self.market_cache = MarketCache(self.name, lambda : run_sync(self.request('fetch_markets')), self.step_size)
+		self.prices = PriceService(self)
+		self.reconciler = OrderReconciler(self)
+		self.markets_set = False
+		# Removed again in close so a closed adapter isn't kept alive and scraped
+		self.pending_gauge = lambda : len(self.reconciler)
+		metrics.gauge('pending_orders', self.pending_gauge, exchange=self.name)
+
+
+	# ccxt exchange logged in with this exchange's keys from keys.json
+	def make_exchange(self, api_keys):
+		keys = api_keys['%s_keys' % self.name]
+		self.api_keys = {k:keys[k] for k in self.key_fields}
+		return getattr(ccxt_async, self.name)({ccxt_key:self.api_keys[k] for k, ccxt_key in self.key_fields.items()})
+
+
+	# Amount step size of a market
+	def step_size(self, market):
+		return 10**(-market['precision']['amount'])
+
+
+	"""
+	Rate limited exchange request, timed per method in the metrics
+	"""
+	async def request(self, method, *args, **kwargs):
+		if method != 'fetch_markets':
+			await self.load_markets()
+		async with self.limiter.request():
+			with metrics.timer('exchange_request_seconds', exchange=self.name, method=method):
+				try:
+					return await getattr(self.exchange, method)(*args, **kwargs)
+				except Exception:
+					metrics.inc('exchange_errors_total', exchange=self.name, method=method)
+					raise
+
+
+	"""
+	Give ccxt the locally cached markets so it doesn't download them before the first order
+	The market cache blocks on file and network access so it runs on a worker thread
+	"""
+	async def load_markets(self):
+		if not self.markets_set:
+			markets = await asyncio.to_thread(lambda : self.market_cache.markets)
+			self.exchange.set_markets(list(markets.values()))
+			self.markets_set = True
+
+
+	# Amount step size and minimum buy amount for a symbol
+	async def limits(self, ticker):
+		return await asyncio.to_thread(self.market_cache.limits, ticker)
+
+
+	"""
+	Smallest order in the quote currency for a symbol at a price, from the market's minimum amount and cost
+	"""
+	async def min_buy_cost(self, ticker, price):
+		(step_size, min_amount), min_cost = await asyncio.to_thread(lambda : (self.market_cache.limits(ticker), self.market_cache.min_cost(ticker)))
+		return max((min_amount or 0) * price, min_cost or 0)
+
+
+	# Place the market buy order
+	async def create_buy_order(self, ticker, buy_volume, price):
+		return await self.request('create_order', ticker, 'market', 'buy', buy_volume)
+
+
+	"""
+	Buy, the order is returned as soon as it is placed with dca_status 'submitted'
+	and updated in place once the reconciler has its fills and fees, on_final(trade) is called then
+	dca_carry on the trade is the amount (quote currency) left over or overspent from rounding to the step size and minimum,
+	fields are set on the trade before it is handed to the reconciler so on_final always sees them
+	"""
+	async def buy(self, ticker, buy_volume, on_final=None, fields=None):
+
+		price = await self.prices.ask(ticker)
+		buy_volume /= price
+		requested_volume = buy_volume
+		step_size, min_buy_amount = await self.limits(ticker)
+		buy_volume = round(buy_volume*1/step_size) * step_size
+
+		# Check if the buy volume is the minimum amount for this exchange
+		if self.check_minimum and min_buy_amount is not None and buy_volume < min_buy_amount:
+			if buy_volume < 0.5*min_buy_amount:
+				print('Buy amount %.6f lower than half the mininmum trade amount for %s, not trading' % (buy_volume, ticker))
+				return
+			buy_volume = min_buy_amount
+			print('Buy amount lower than minimum trade amount for %s, buying min volume %.6f' % (ticker, buy_volume))
+
+		print('Buying %.6f %s'% (buy_volume, ticker))
+		buy_trade = await self.create_buy_order(ticker, buy_volume, price)
+		buy_trade['dca_carry'] = (requested_volume - buy_volume) * price
+		buy_trade.update(fields or {})
+		self.reconciler.submit(buy_trade, on_final)
+		print('Submitted order %s for %.6f %s' % (buy_trade['id'], buy_volume, ticker))
+
+		return buy_trade
+
+
+	"""
+	Fetch the order once, returns the fields to update the trade with (including its status)
+	"""
+	async def fetch_fill(self, trade):
+		return await self.request('fetch_order', trade['id'], trade['symbol'])
+
+
+	# Wait for the reconciler to finish with the order and return it with its fees
+	async def retrieve_order_fees(self, trade):
+		if trade.get('dca_status') == 'final':
+			return trade
+		future = self.reconciler.pending[trade['id']]['future'] if trade['id'] in self.reconciler.pending else self.reconciler.submit(trade)
+		return await future
+
+
+	# Record a trade at price (the exchange's ask when not given) without placing an order
+	async def simulate_buy(self, ticker, buy_volume, price=None):
+
+		trade_price = price if price is not None else await self.prices.ask(ticker)
+
+		print('\nSimulated Buy: ${} at {:.8f} {} = {:.6f}{}'.format(buy_volume, trade_price, ticker, buy_volume/trade_price, ticker.split('/')[0]))
+		trade = {'symbol':ticker ,'side':'buy', 'amount':buy_volume / trade_price, 'cost':buy_volume, 'price':trade_price}
+
+		return trade
+
+
+	async def close(self):
+		metrics.remove_gauge('pending_orders', self.pending_gauge, exchange=self.name)
+		await self.exchange.close()
+
+
+"""
+Synchronous facade over an async exchange adapter, every call runs on the shared event loop
+"""
+class sync_exchange_api:
+
+	core_class = async_exchange_api
+
+	def __init__(self, api_keys):
+		self.core = self.core_class(api_keys)
+		self.exchange = self.core.exchange
+		self.market_cache = self.core.market_cache
+
+
+	# Markets from the local cache, downloaded on first use if the cache is old
+	@property
+	def markets(self):
+		return self.market_cache.markets
+
+
+	# Re-download the markets
+	def get_markets(self):
+		self.market_cache.refresh()
+
+
+	def prefetch_prices(self, symbols):
+		run_sync(self.core.prices.prefetch(symbols))
+
+
+	def buy(self, ticker, buy_volume, on_final=None, fields=None):
+		return run_sync(self.core.buy(ticker, buy_volume, on_final, fields))
+
+
+	# Reconcile an order still marked as submitted (e.g. after resuming)
+	def reconcile(self, trade, on_final=None):
+		get_loop().call_soon_threadsafe(self.core.reconciler.submit, trade, on_final)
+
+
+	def retrieve_order_fees(self, trade):
+		return run_sync(self.core.retrieve_order_fees(trade))
+
+
+	def simulate_buy(self, ticker, buy_volume, price=None):
+		return run_sync(self.core.simulate_buy(ticker, buy_volume, price))
+
+
+	def close(self):
+		run_sync(self.core.close())
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+
+# One event loop shared by every exchange adapter and the scheduler, run on a daemon thread
+_loop = None
+_lock = threading.Lock()
+
+
+"""
+The shared event loop, started on first use
+"""
+def get_loop():
+	global _loop
+	with _lock:
+		if _loop is None:
+			_loop = asyncio.new_event_loop()
+			threading.Thread(target=_loop.run_forever, name='event_loop', daemon=True).start()
+	return _loop
+
+
+"""
+Run a coroutine on the shared loop and block the calling thread until it finishes
+Must not be called from the loop thread itself
+"""
+def run_sync(coro, timeout=None):
+	loop = get_loop()
+	try:
+		running = asyncio.get_running_loop()
+	except RuntimeError:
+		running = None
+	if running is loop:
+		coro.close()
+		raise RuntimeError('run_sync called from inside the event loop, await the coroutine instead')
+	return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+"""
+Start a coroutine on the shared loop without waiting for it, returns a concurrent.futures.Future
+"""
+def spawn(coro):
+	return asyncio.run_coroutine_threadsafe(coro, get_loop())
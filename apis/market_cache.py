@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+
+
+"""
+Markets of an exchange stored in cache/ and only downloaded when the stored copy is older than ttl seconds
+Nothing is loaded until it is first used, checking a symbol or getting its buy limits only reads
+the small per symbol index of amount step size and minimum buy amount, not the full markets
+"""
+class MarketCache:
+
+	def __init__(self, name, fetch_markets, step_size, ttl=3600*24, root='cache'):
+		self.name = name
+		self.fetch_markets = fetch_markets
+		self.step_size = step_size
+		self.ttl = ttl
+		self.markets_path = os.path.join(root, 'markets_%s.json' % name)
+		self.index_path = os.path.join(root, 'markets_%s_index.json' % name)
+		self.lock = threading.RLock()
+		self._markets = None
+		self._index = None
+
+
+	def __contains__(self, symbol):
+		return symbol in self.index
+
+
+	"""
+	Full markets {symbol: market} from ccxt
+	"""
+	@property
+	def markets(self):
+		with self.lock:
+			if self._markets is None:
+				self._markets = self._read(self.markets_path)
+			if self._markets is None:
+				self.refresh()
+			return self._markets
+
+
+	"""
+	{symbol: {'step_size':..., 'min_amount':...}} used to round and check buy amounts
+	"""
+	@property
+	def index(self):
+		with self.lock:
+			if self._index is None:
+				self._index = self._read(self.index_path)
+			if self._index is None:
+				self._index = self.build_index(self.markets)
+				self._write(self.index_path, self._index)
+			return self._index
+
+
+	"""
+	Amount step size and minimum buy amount (None if the exchange doesn't give one) for a symbol
+	"""
+	def limits(self, symbol):
+		limits = self.index[symbol]
+		return limits['step_size'], limits['min_amount']
+
+
+	# Minimum order cost in the quote currency for a symbol, None if the exchange doesn't give one
+	def min_cost(self, symbol):
+		return self.index[symbol].get('min_cost')
+
+
+	"""
+	Download the markets and rebuild the index
+	"""
+	def refresh(self):
+		with self.lock:
+			self._markets = {market['symbol']:market for market in self.fetch_markets()}
+			self._index = self.build_index(self._markets)
+			self._write(self.markets_path, self._markets)
+			self._write(self.index_path, self._index)
+
+
+	def build_index(self, markets):
+		index = {}
+		for symbol, market in markets.items():
+			try:
+				min_amount = market['limits']['amount']['min']
+				min_cost = (market['limits'].get('cost') or {}).get('min')
+				index[symbol] = {'step_size':self.step_size(market), 'min_amount':float(min_amount) if min_amount is not None else None,
+					'min_cost':float(min_cost) if min_cost is not None else None}
+			except (KeyError, TypeError):
+				continue
+		return index
+
+
+	# Stored data if it is younger than the ttl otherwise None
+	def _read(self, path):
+		try:
+			with open(path, 'r') as json_file:
+				stored = json.load(json_file)
+			if time.time() - stored['timestamp'] < self.ttl:
+				return stored['data']
+		except (FileNotFoundError, ValueError, KeyError):
+			pass
+		return None
+
+
+	def _write(self, path, data):
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path + '.tmp', 'w') as json_file:
+			json.dump({'timestamp':time.time(), 'data':data}, json_file)
+		os.replace(path + '.tmp', path)
@@ -0,0 +1,252 @@
+import os
+import csv
+import json
+import time
+import asyncio
+from datetime import datetime
+from lazy import lazy_module
+from clock import Clock
+
+np = lazy_module('numpy')
+
+
+"""
+Quotes for simulated buys shared by every plan of a DCA, the simulation fills at the ask of the feed
+A feed has the same methods as the adapter's PriceService (prefetch, quote, ask) and a close
+	QuoteCache   polls the exchange for every symbol the plans buy in one request per interval, buys read the cache
+	ReplayFeed   recorded quotes from a local file, no network at all
+"""
+
+
+"""
+Polling quote cache for an exchange adapter
+One task refreshes all the subscribed symbols every interval seconds with fetch_tickers (one fetch_ticker per symbol
+on exchanges without it), a symbol is subscribed the first time it is quoted and plans asking for new symbols at the
+same time share one request. record is a replay file every polled quote is appended to
+"""
+class QuoteCache:
+
+	def __init__(self, api, interval=10, record=None):
+		self.api = api
+		self.interval = interval
+		self.symbols = set()
+		self.quotes = {} # {symbol: (time fetched, ticker)}
+		self.fetching = None
+		self.task = None
+		self.record = QuoteRecorder(record) if record else None
+
+
+	"""
+	Subscribe the symbols and fetch the ones that have no quote yet
+	"""
+	async def prefetch(self, symbols):
+		self.symbols.update(symbols)
+		if any(symbol not in self.quotes for symbol in symbols):
+			await self.fetch_missing()
+
+
+	async def quote(self, symbol):
+
+		if symbol not in self.quotes:
+			self.symbols.add(symbol)
+			await self.fetch_missing()
+		if self.task is None:
+			self.task = asyncio.ensure_future(self.poll())
+
+		# Exchanges leave out symbols without a quote from fetch_tickers
+		if symbol not in self.quotes:
+			self.store({symbol:await self.api.request('fetch_ticker', symbol)})
+		return self.quotes[symbol][1]
+
+
+	async def ask(self, symbol):
+		return (await self.quote(symbol))['ask']
+
+
+	# Fetch the subscribed symbols without a quote, callers arriving while a fetch is running wait for it
+	async def fetch_missing(self):
+		if self.fetching is None or self.fetching.done():
+			self.fetching = asyncio.ensure_future(self.refresh(missing_only=True))
+		await asyncio.shield(self.fetching)
+
+
+	async def refresh(self, missing_only=False):
+
+		# Let the other plans due in the same wakeup subscribe first
+		await asyncio.sleep(0)
+		symbols = sorted(s for s in self.symbols if not missing_only or s not in self.quotes)
+		if not symbols:
+			return
+		if len(symbols) > 1 and self.api.exchange.has.get('fetchTickers'):
+			tickers = await self.api.request('fetch_tickers', symbols)
+		else:
+			fetched = await asyncio.gather(*[self.api.request('fetch_ticker', symbol) for symbol in symbols])
+			tickers = dict(zip(symbols, fetched))
+		self.store(tickers)
+
+
+	def store(self, tickers):
+		fetched = time.time()
+		for symbol, ticker in tickers.items():
+			if ticker.get('ask') is not None:
+				self.quotes[symbol] = (fetched, ticker)
+		if self.record:
+			self.record.write(fetched, tickers)
+
+
+	async def poll(self):
+		while 1:
+			await asyncio.sleep(self.interval)
+			try:
+				await self.refresh()
+			except Exception as e:
+				print('Error refreshing quotes, using the last ones: %s' % e)
+
+
+	async def close(self):
+		if self.task is not None:
+			self.task.cancel()
+			self.task = None
+		if self.record:
+			self.record.close()
+
+
+# Replay files ending in .csv are csv, any other name is json lines
+def is_csv(path):
+	return path.endswith('.csv')
+
+
+"""
+Appends quotes to a replay file as timestamp (ms), symbol, bid, ask, csv rows or json lines by the file name like load_quotes
+"""
+class QuoteRecorder:
+
+	fields = ['timestamp', 'symbol', 'bid', 'ask']
+
+	def __init__(self, path):
+		new = not os.path.exists(path) or os.path.getsize(path) == 0
+		self.file = open(path, 'a', newline='')
+		self.writer = csv.writer(self.file) if is_csv(path) else None
+		if new and self.writer:
+			self.writer.writerow(self.fields)
+
+
+	def write(self, fetched, tickers):
+		for symbol, ticker in sorted(tickers.items()):
+			if ticker.get('ask') is not None:
+				row = [ticker.get('timestamp') or int(fetched * 1000), symbol, ticker.get('bid'), ticker['ask']]
+				if self.writer:
+					self.writer.writerow(row)
+				else:
+					self.file.write(json.dumps(dict(zip(self.fields, row))) + '\n')
+		self.file.flush()
+
+
+	def close(self):
+		self.file.close()
+
+
+"""
+Quotes replayed from a file, the quote of a symbol is the last one recorded at or before the time of clock()
+Reads a .csv file with a timestamp,symbol,bid,ask header (timestamps in ms or iso format) or json lines of ccxt tickers
+(any other name) as written by QuoteRecorder
+clock returns unix seconds, with shift the first recorded quote lines up with start (unix seconds, the time the clock
+started, when the feed is made if not given) and the quotes move with the clock from there, so on a VirtualClock
+the same file gives the same fills on every run
+"""
+class ReplayFeed:
+
+	def __init__(self, path, clock=time.time, shift=False, series=None, start=None):
+		self.path = path
+		self.clock = clock
+		self.series = series if series is not None else load_quotes(path) # {symbol: (timestamps ms, bids, asks)}
+		if not self.series:
+			raise ValueError('No quotes in %s' % path)
+		self.offset = 0
+		if shift:
+			self.offset = min(series[0][0] for series in self.series.values()) / 1000 - (clock() if start is None else start)
+
+
+	"""
+	Feed quoting the open of the stored candle each time falls in (for replaying history from a CandleStore)
+	"""
+	@classmethod
+	def from_candles(cls, store, exchange, symbols, interval, clock=time.time):
+		series = {}
+		for symbol in symbols:
+			candles = store.load(exchange, symbol, interval)
+			opens = np.asarray(candles['open'], dtype=float)
+			if len(opens):
+				series[symbol] = (np.asarray(candles['timestamp'], dtype=float), opens, opens)
+		return cls('%s %s candles' % (exchange, interval), clock, series=series)
+
+
+	def now(self):
+		return (self.clock() + self.offset) * 1000
+
+
+	async def prefetch(self, symbols):
+		pass
+
+
+	async def quote(self, symbol):
+		return self.quote_at(symbol, self.now())
+
+
+	def quote_at(self, symbol, t):
+
+		if symbol not in self.series:
+			raise KeyError('No quotes for %s in %s' % (symbol, self.path))
+		timestamps, bids, asks = self.series[symbol]
+		i = np.searchsorted(timestamps, t, side='right') - 1
+		if i < 0:
+			raise ValueError('No quote for %s before %s in %s' % (symbol, datetime.fromtimestamp(t / 1000), self.path))
+		return {'symbol':symbol, 'timestamp':int(timestamps[i]), 'bid':float(bids[i]), 'ask':float(asks[i])}
+
+
+	async def ask(self, symbol):
+		return (await self.quote(symbol))['ask']
+
+
+	async def close(self):
+		pass
+
+
+"""
+Quotes from a replay file as {symbol: (timestamps ms, bids, asks)} numpy arrays sorted by time
+"""
+def load_quotes(path):
+
+	rows = {}
+	with open(path, 'r', newline='') as f:
+		if is_csv(path):
+			records = ({'timestamp':row['timestamp'], 'symbol':row['symbol'], 'bid':row.get('bid'), 'ask':row['ask']} for row in csv.DictReader(f))
+		else:
+			records = (json.loads(line) for line in f if line.strip())
+		for record in records:
+			timestamp = record['timestamp']
+			if isinstance(timestamp, str):
+				timestamp = float(timestamp) if timestamp.replace('.', '', 1).isdigit() else datetime.fromisoformat(timestamp).timestamp() * 1000
+			ask = float(record['ask'])
+			bid = float(record['bid']) if record.get('bid') not in (None, '') else ask
+			rows.setdefault(record['symbol'], []).append((timestamp, bid, ask))
+
+	series = {}
+	for symbol, quotes in rows.items():
+		quotes.sort(key=lambda quote : quote[0])
+		timestamps, bids, asks = (np.array(column, dtype=float) for column in zip(*quotes))
+		series[symbol] = (timestamps, bids, asks)
+	return series
+
+
+"""
+Price feed for a simulating DCA from a spec: None or 'poll' for a QuoteCache on the adapter, a file path for a ReplayFeed
+(its first quote at the clock's start, moving with the clock), anything else is used as the feed
+"""
+def make_price_feed(spec, api, record=None, clock=None):
+	if spec is None or spec == 'poll':
+		return QuoteCache(api, record=record)
+	if isinstance(spec, str):
+		clock = clock or Clock()
+		return ReplayFeed(spec, clock=clock.time, shift=True, start=clock.start.timestamp())
+	return spec
@@ -0,0 +1,55 @@
+import time
+
+
+"""
+Short lived cache of ticker quotes for an exchange adapter
+Symbols due in the same wakeup are fetched together with one fetch_tickers call when the exchange supports it,
+buys then read the cached quote and only fall back to fetch_ticker for a symbol that is missing or too old
+Runs on the adapter's event loop so the cache needs no lock
+"""
+class PriceService:
+
+	def __init__(self, api, max_age=5):
+		self.api = api
+		self.max_age = max_age
+		self.quotes = {} # {symbol: (time fetched, ticker)}
+
+
+	"""
+	Fetch the quotes for symbols about to be bought in one request
+	"""
+	async def prefetch(self, symbols):
+
+		now = time.time()
+		missing = sorted(set(s for s in symbols if s not in self.quotes or now - self.quotes[s][0] > self.max_age))
+		if len(missing) < 2 or not self.api.exchange.has.get('fetchTickers'):
+			return
+
+		try:
+			tickers = await self.api.request('fetch_tickers', missing)
+		except Exception as e:
+			print('Error fetching tickers for %s, fetching them one at a time\n%s' % (', '.join(missing), e))
+			return
+
+		fetched = time.time()
+		for symbol, ticker in tickers.items():
+			if ticker.get('ask') is not None:
+				self.quotes[symbol] = (fetched, ticker)
+
+
+	"""
+	Ticker for a symbol from the cache if it is recent enough otherwise from fetch_ticker
+	"""
+	async def quote(self, symbol):
+
+		cached = self.quotes.get(symbol)
+		if cached and time.time() - cached[0] <= self.max_age:
+			return cached[1]
+
+		ticker = await self.api.request('fetch_ticker', symbol)
+		self.quotes[symbol] = (time.time(), ticker)
+		return ticker
+
+
+	async def ask(self, symbol):
+		return (await self.quote(symbol))['ask']
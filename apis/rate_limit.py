@@ -0,0 +1,31 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+
+"""
+Limits the requests to one exchange from the coroutines on one event loop, waiting doesn't block the loop
+At most max_concurrent requests are in flight and they are started at most per_second times a second
+"""
+class AsyncRateLimiter:
+
+	def __init__(self, max_concurrent=5, per_second=10):
+		self.semaphore = asyncio.Semaphore(max_concurrent)
+		self.interval = 1 / per_second
+		self.next_slot = time.monotonic()
+
+
+	async def wait(self):
+		now = time.monotonic()
+		slot = max(now, self.next_slot)
+		self.next_slot = slot + self.interval
+		if slot > now:
+			await asyncio.sleep(slot - now)
+
+
+	@asynccontextmanager
+	async def request(self):
+		async with self.semaphore:
+			await self.wait()
+			yield
+
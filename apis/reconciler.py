@@ -0,0 +1,151 @@
+import time
+import asyncio
+import threading
+import traceback
+from metrics import metrics
+
+
+"""
+Background reconciliation of submitted orders for one exchange adapter
+Orders are polled with exponential backoff until they are no longer open, then the fees of all the orders
+closed in the same pass are looked up with one fetch_my_trades call per symbol
+The trade dict is updated in place under the reconciler's own lock, held only for each update, and marked 'final'
+"""
+class OrderReconciler:
+
+	def __init__(self, api, first_delay=0.5, max_delay=30, max_polls=8, fee_window=10):
+		self.api = api
+		self.first_delay = first_delay
+		self.max_delay = max_delay
+		self.max_polls = max_polls
+		self.fee_window = fee_window
+		self.pending = {} # {order id: {'trade', 'polls', 'delay', 'next', 'submitted', 'future', 'on_final'}}
+		self.lock = threading.Lock()
+		self.wakeup = asyncio.Event()
+		self.task = None
+
+
+	def __len__(self):
+		return len(self.pending)
+
+
+	"""
+	Record the order as submitted and reconcile it in the background, must be called on the event loop
+	Returns a future with the final trade, on_final(trade) is also called on a worker thread once it is final
+	"""
+	def submit(self, trade, on_final=None):
+
+		with self.lock:
+			trade['dca_status'] = 'submitted'
+		future = asyncio.get_running_loop().create_future()
+		self.pending[trade['id']] = {'trade':trade, 'polls':0, 'delay':self.first_delay, 'next':time.monotonic(),
+			'submitted':time.time(), 'future':future, 'on_final':on_final}
+
+		if self.task is None or self.task.done():
+			self.task = asyncio.ensure_future(self.run())
+		self.wakeup.set()
+
+		return future
+
+
+	"""
+	Poll the pending orders until none are left
+	"""
+	async def run(self):
+
+		while self.pending:
+			try:
+				# Wait for the next order to be due or a new order
+				self.wakeup.clear()
+				now = time.monotonic()
+				due = [order for order in self.pending.values() if order['next'] <= now]
+				if not due:
+					try:
+						await asyncio.wait_for(self.wakeup.wait(), timeout=min(order['next'] for order in self.pending.values()) - now)
+					except asyncio.TimeoutError:
+						pass
+					continue
+
+				fills = await asyncio.gather(*[self.api.fetch_fill(order['trade']) for order in due], return_exceptions=True)
+
+				closed = []
+				for order, fill in zip(due, fills):
+					order['polls'] += 1
+					if isinstance(fill, Exception):
+						print('Error: polling order %s - %s' % (order['trade']['id'], fill))
+						metrics.inc('errors_total', where='reconciler_poll')
+						fill = None
+					elif fill:
+						with self.lock:
+							order['trade'].update(fill)
+
+					if (fill and fill.get('status') not in [None, 'open']) or order['polls'] >= self.max_polls:
+						closed.append(order)
+					else:
+						order['next'] = time.monotonic() + order['delay']
+						order['delay'] = min(order['delay'] * 2, self.max_delay)
+
+				if closed:
+					await self.retrieve_fees([order for order in closed if order['trade'].get('fee') is None])
+					for order in closed:
+						await self.finalise(order)
+
+			except Exception as e:
+				print('Error: reconciling orders - %s' % (traceback.format_exc()))
+				metrics.inc('errors_total', where='reconciler')
+				await asyncio.sleep(self.first_delay)
+
+
+	"""
+	Fill in the fees and timestamp of closed orders from one fetch_my_trades call per symbol
+	"""
+	async def retrieve_fees(self, orders):
+
+		by_symbol = {}
+		for order in orders:
+			by_symbol.setdefault(order['trade']['symbol'], []).append(order)
+
+		for symbol, symbol_orders in by_symbol.items():
+			since = min(order['trade'].get('timestamp') or order['submitted'] * 1000 for order in symbol_orders)
+			try:
+				trades = await self.api.request('fetch_my_trades', symbol, since=int(since - self.fee_window * 1000))
+			except Exception as e:
+				print('Error: fetching trades for %s - %s' % (symbol, e))
+				metrics.inc('errors_total', where='reconciler_fees')
+				continue
+
+			for order in symbol_orders:
+				order_trades = [t for t in trades if t['order'] == order['trade']['id']]
+				if not order_trades:
+					continue
+				fees = None
+				if order_trades[-1]['fee'] is not None:
+					fees = {'cost':sum(t['fee']['cost'] for t in order_trades if t['fee']), 'currency':order_trades[-1]['fee']['currency']}
+					print('Get trades for %s since fees were not present cost: %s  currency: %s' % (symbol, fees['cost'], fees['currency']))
+				with self.lock:
+					order['trade']['fee'] = fees
+
+					# Changing the timestamp to the last trade timestamp
+					if order['trade'].get('timestamp') is None:
+						order['trade']['timestamp'] = order_trades[-1]['timestamp']
+
+
+	# Mark the trade final and hand it to whoever is waiting for it
+	async def finalise(self, order):
+
+		trade = order['trade']
+		with self.lock:
+			trade['dca_status'] = 'final'
+		self.pending.pop(trade['id'], None)
+		metrics.observe('order_final_seconds', time.time() - order['submitted'], exchange=self.api.name)
+		if trade.get('cost') is not None and trade.get('price') is not None:
+			print('Bought: %.6f %s at $%.8f' % (trade['cost'], trade['symbol'].split('/')[1], trade['price']))
+
+		if order['on_final']:
+			try:
+				await asyncio.to_thread(order['on_final'], trade)
+			except Exception as e:
+				print('Error: handling final trade - %s' % (traceback.format_exc()))
+				metrics.inc('errors_total', where='on_final')
+		if not order['future'].done():
+			order['future'].set_result(trade)
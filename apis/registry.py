@@ -0,0 +1,38 @@
+import importlib
+
+
+"""
+Exchange adapters by name with the prompt's short name, the coin held by default and the most candles a fetch_ohlcv
+page can hold when it's more than the exchange gives by default (None keeps the default)
+An adapter's module (and ccxt with it) is only imported when the exchange is first used, one run only needs one
+"""
+exchanges = {}
+
+
+# Add an exchange by the module of its adapter or by the adapter class itself (api) like the benchmarks' fake exchange
+def register(name, module=None, hold='USDT', short=None, api=None, ohlcv_limit=None):
+	exchanges[name] = {'name':name, 'module':module, 'hold':hold, 'short':short or name, 'api':api, 'ohlcv_limit':ohlcv_limit}
+
+
+register('binance', 'apis.binance_api', 'USDT', 'b', ohlcv_limit=1000)
+register('ftx', 'apis.ftx_api', 'USD', 'f')
+register('kraken', 'apis.kraken_api', 'USD', 'kr')
+register('kucoin', 'apis.kucoin_api', 'USDT', 'ku')
+register('mexc', 'apis.mexc_api', 'USDT', 'm')
+
+
+"""
+Sync adapter class of an exchange (<name>_api in its module), raises ValueError for an unknown exchange
+"""
+def load_api(name):
+	if name not in exchanges:
+		raise ValueError('Unknown exchange %s, use one of %s' % (name, '/'.join(exchanges)))
+	exchange = exchanges[name]
+	if exchange['api'] is None:
+		exchange['api'] = getattr(importlib.import_module(exchange['module']), '%s_api' % name)
+	return exchange['api']
+
+
+# Empty keys for the public endpoints of an exchange (candles, tickers)
+def public_keys(name):
+	return {'%s_keys' % name:{k:'' for k in load_api(name).core_class.key_fields}}
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+import strategies
+from strategies import curves
+
+
+"""
+Columns of the DataFrame returned by DCA.get_average (indexed by date)
+"""
+columns = ['price','weight','dollar_spend','dollar_spend_tot','dollar_left','crypto_vol','crypto_tot']
+
+
+"""
+Weighting functions of the fear and greed index (0-100) giving the buy multiplier, the curves of the live fear_greed strategy
+Work on single values and whole arrays
+"""
+weightings = curves
+
+
+"""
+Vectorized DCA over arrays of open prices and weights (one element per candle)
+Buys on every freq-th candle until the total has been spent, the buy that crosses the total
+only spends what is left and every candle after that is reported with no buy
+A nan weight (rsi warming up, days missing fear and greed) carries into the totals like the row by row backtest,
+nan_weight=1 buys the plain amount there instead like dca_panel and the bot
+Returns the row positions reported and a dictionary of column arrays for those rows
+"""
+def dca_arrays(prices, weights, dollar_amount, freq, total, nan_weight=None):
+
+	prices = np.asarray(prices, dtype=float)
+	weights = np.asarray(weights)
+	if nan_weight is not None and weights.dtype.kind == 'f':
+		weights = np.where(np.isnan(weights), nan_weight, weights)
+	weights = np.broadcast_to(weights, prices.shape)
+	n = len(prices)
+
+	# Dollars spent on every buy candle before the total runs out
+	buy_rows = np.arange(0, n, freq)
+	spend = dollar_amount * weights[buy_rows]
+	spent = np.cumsum(spend)
+	prev_spent = np.concatenate((np.zeros(1, dtype=spent.dtype), spent[:-1]))
+
+	# The first buy that reaches the total only spends the leftover and stops the buys
+	if total <= 0:
+		last_buy, finished = -1, True
+	else:
+		crossed = np.flatnonzero(spent >= total)
+		finished = len(crossed) > 0
+		last_buy = crossed[0] if finished else len(buy_rows) - 1
+
+	# Keep integer columns when the amounts are integers like the row by row backtest
+	spend_dtype = np.result_type(spend, np.asarray(total)) if finished else spend.dtype
+	buy_rows = buy_rows[:last_buy+1]
+	spend = spend[:last_buy+1].astype(spend_dtype)
+	spent = spent[:last_buy+1].astype(spend_dtype)
+	dollar_left = total - spent
+	if finished and last_buy >= 0:
+		spend[-1] = total - prev_spent[last_buy]
+		spent[-1] = prev_spent[last_buy] + spend[-1]
+		dollar_left[-1] = 0
+	elif not len(buy_rows):
+		spend, spent, dollar_left = spend.astype(int), spent.astype(int), dollar_left.astype(int)
+
+	# Every candle after the total has run out is reported with no buy
+	first_idle = (buy_rows[-1] + 1) if len(buy_rows) else 0
+	idle_rows = np.arange(first_idle, n) if finished else np.arange(0)
+	final_spent = spent[-1] if len(spent) else 0
+	zeros = np.zeros(len(idle_rows), dtype=int)
+
+	crypto_vol = np.concatenate((spend / prices[buy_rows] if len(buy_rows) else spend, zeros))
+	rows = np.concatenate((buy_rows, idle_rows))
+	ret = {
+		'price': prices[rows],
+		'weight': weights[rows],
+		'dollar_spend': np.concatenate((spend, zeros)),
+		'dollar_spend_tot': np.concatenate((spent, np.full(len(idle_rows), final_spent))),
+		'dollar_left': np.concatenate((dollar_left, zeros)),
+		'crypto_vol': crypto_vol,
+		'crypto_tot': np.cumsum(crypto_vol),
+	}
+
+	return rows, len(buy_rows), ret
+
+
+"""
+DCA backtest which gives you the total amount invested over a time period and the average price you would have got
+"""
+class DCA:
+
+	def __init__(self, total, df, since=datetime.now() - timedelta(days=365*3.3)):
+		self.total = total
+		self.since = since
+		self.df = df
+
+
+	"""
+	Run the dca strategy with the parameters entered
+	weighting is the name of a strategy (with its params) computed from its input columns or a column of weights in the DataFrame,
+	nan_weight is the weight of candles without one (see dca_arrays)
+	Returns the crypto volumes bought, dollars spent, buy prices, buy dates and the DataFrame of every reported candle
+	"""
+	def get_average(self, dollar_amount, freq, ticker, weighting=None, params=None, nan_weight=None):
+
+		df = self.df[self.df.index > self.since]
+		if not weighting:
+			weights = 1
+		elif weighting in strategies.registry:
+			weights = strategies.get(weighting).weights(df, **(params or {}))
+		else:
+			weights = df[weighting].to_numpy()
+		rows, n_buys, ret = dca_arrays(df.open.to_numpy(), weights, dollar_amount, freq, self.total, nan_weight)
+
+		ret_df = pd.DataFrame(ret, columns=columns, index=pd.Index(df.index[rows], name='date'))
+		volumes = ret['crypto_vol'][:n_buys].tolist()
+		prices = ret['price'][:n_buys].tolist()
+		dates = list(df.index[rows[:n_buys]])
+		spent = ret['dollar_spend_tot'][-1] if len(rows) else 0
+
+		return volumes, spent, prices, dates, ret_df
+
+
+"""
+Vectorized DCA of every coin of a Panel in one pass, each coin is bought on every freq-th of its own candles after since
+(the first one included) until it has spent total, the buy that crosses total only spends what is left like dca_arrays
+weighting is a strategy name (its inputs are the panel's fields and series) or a time x coin array, a nan weight buys
+nan_weight times the amount (the plain amount like the bot, where dca_arrays keeps the nan unless asked),
+dollar_amount and total can be one value or one per coin
+Returns a dictionary of time x coin arrays (the same names as columns, dollar_spend is 0 where nothing is bought)
+with portfolio_value per coin and the portfolio total over the coins as 'total_value'
+"""
+def dca_panel(panel, dollar_amount, freq, total, since=None, weighting=None, params=None, nan_weight=1.):
+
+	prices = panel['open']
+	if since is not None:
+		prices = np.where((panel.index > since)[:, None], prices, np.nan)
+	valid = ~np.isnan(prices)
+
+	if not weighting:
+		weights = np.ones(prices.shape)
+	elif isinstance(weighting, str):
+		weights = np.broadcast_to(strategies.get(weighting).weights(panel.inputs(), **(params or {})), prices.shape)
+	else:
+		weights = np.broadcast_to(np.asarray(weighting, dtype=float), prices.shape)
+	if nan_weight is not None:
+		weights = np.where(np.isnan(weights), nan_weight, weights)
+
+	# Every freq-th candle each coin has, counted from its first one
+	position = np.cumsum(valid, axis=0) - 1
+	buy = valid & (position % freq == 0)
+	spend = np.where(buy, np.asarray(dollar_amount, dtype=float) * np.where(buy, weights, 0), 0.)
+
+	# The first buy that reaches the total only spends the leftover and stops the coin's buys
+	total = np.broadcast_to(np.asarray(total, dtype=float), prices.shape[1:])
+	spent = np.cumsum(spend, axis=0)
+	prev_spent = spent - spend
+	crossing = buy & (spent >= total) & (prev_spent < total)
+	spend = np.where(prev_spent >= total, 0., np.where(crossing, total - prev_spent, spend))
+	spent = np.where(crossing | (prev_spent >= total), total, spent)
+
+	crypto_vol = np.where(spend > 0, spend / np.where(valid, prices, 1), 0.)
+	crypto_tot = np.cumsum(crypto_vol, axis=0)
+	last_price = pd.DataFrame(panel['open']).ffill().to_numpy()
+	dollar_left = total - spent
+	portfolio_value = np.nan_to_num(crypto_tot * last_price) + dollar_left
+
+	return {'price':prices, 'weight':np.where(buy, weights, np.nan), 'dollar_spend':spend, 'dollar_spend_tot':spent, 'dollar_left':dollar_left,
+		'crypto_vol':crypto_vol, 'crypto_tot':crypto_tot, 'portfolio_value':portfolio_value, 'total_value':portfolio_value.sum(axis=1)}
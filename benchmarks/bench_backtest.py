@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backtest import DCA
+
+
+"""
+Row by row backtest from the analysis notebook kept as the reference for the vectorized engine
+(DataFrame.append replaced with pd.concat which does the same copy)
+"""
+def get_average_rows(df, total, since, dollar_amount, freq, weighting=None):
+	ret_df, prices, volumes, dates, spent = pd.DataFrame(), [], [], [], 0
+	cols = ['date','price','weight','dollar_spend','dollar_spend_tot','dollar_left','crypto_vol','crypto_tot']
+
+	weight = 1
+	for i, row in enumerate(df[df.index > since].iterrows()):
+		if weighting:
+			weight = row[1][weighting]
+
+		if spent >= total:
+			ret_df = pd.concat([ret_df, pd.DataFrame([[row[0],row[1].open,weight,0,spent,0,0,sum(volumes)]], columns=cols)])
+
+		elif i % freq == 0:
+			dates.append(row[0])
+			if spent + dollar_amount * weight >= total:
+				leftover_dollar = total - spent
+				crypto_vol = leftover_dollar / row[1].open
+				volumes.append(crypto_vol)
+				prices.append(row[1].open)
+				spent += leftover_dollar
+				ret_df = pd.concat([ret_df, pd.DataFrame([[row[0],row[1].open,weight,leftover_dollar,spent,0,crypto_vol,sum(volumes)]], columns=cols)])
+				continue
+
+			crypto_vol = dollar_amount * weight / row[1].open
+			dollar_spend = dollar_amount * weight
+			volumes.append(crypto_vol)
+			prices.append(row[1].open)
+			spent += dollar_spend
+			ret_df = pd.concat([ret_df, pd.DataFrame([[row[0],row[1].open,weight,dollar_spend,spent,total-spent,crypto_vol,sum(volumes)]], columns=cols)])
+
+	return volumes, spent, prices, dates, ret_df.set_index('date')
+
+
+"""
+Four years of daily candles with a random walk price and fear and greed weighting
+"""
+def make_candles(days=365*4, seed=0):
+	rng = np.random.default_rng(seed)
+	index = pd.date_range(datetime(2018, 1, 1), periods=days, freq='D')
+	df = pd.DataFrame({'open': 10000 * np.exp(np.cumsum(rng.normal(0, 0.03, days)))}, index=index)
+	df['fear_greed'] = rng.integers(5, 95, days)
+	df['fg_Logistic_steep'] = -2/(1+np.exp(-0.17*(df.fear_greed-50)))+2
+	return df
+
+
+def timed(func, repeat):
+	t0 = time.perf_counter()
+	for _ in range(repeat):
+		out = func()
+	return (time.perf_counter() - t0) / repeat, out
+
+
+if __name__ == '__main__':
+	df = make_candles()
+	since = df.index[0] - timedelta(days=1)
+
+	print('%10s %8s %12s %12s %10s' % ('weighting', 'budget', 'rows (s)', 'vector (s)', 'speedup'))
+	for weighting in [None, 'fg_Logistic_steep']:
+		for total in [10000, 1e9]:
+			row_t, expected = timed(lambda: get_average_rows(df, total, since, 100, 7, weighting), 1)
+			vec_t, result = timed(lambda: DCA(total, df, since=since).get_average(100, 7, 'btc', weighting), 50)
+
+			# The vectorized engine has to give the same output as the row by row one
+			pd.testing.assert_frame_equal(result[4], expected[4], check_exact=True, check_index_type=False)
+			assert result[:4] == expected[:4]
+
+			print('%10s %8.0f %12.4f %12.6f %9.0fx' % (weighting and 'fear_greed', total, row_t, vec_t, row_t / vec_t))
@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_exchange import fake_api_class
+from apis.event_loop import run_sync
+from dca import DCA
+
+
+"""
+Benchmark one wakeup with n_plans due against a fake exchange, the same steps as manage_dcas:
+prefetch the prices, run every buy as a task, then wait for the reconciler to finalise all the orders
+Returns seconds until every order was placed and until every order was final, the median and 99th percentile buy
+and the number of calls each exchange method got
+"""
+def bench_buy_path(n_plans, latency=0.02, failure_rate=0.0, simulate=False):
+
+	with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+		# The market cache is written to cache/ in the working directory, keep it in the temporary one
+		cwd = os.getcwd()
+		os.chdir(root)
+		try:
+			dca = DCA('bench', simulate=simulate, api_keys={})
+			dca.hold_coin, dca.exchange_name = 'USDT', 'fake'
+			dca.connect(fake_api_class(n_markets=n_plans, latency=latency, jitter=latency / 2, failure_rate=failure_rate))
+			core = dca.api.core
+			core.reconciler.first_delay = latency
+			dca.api.markets
+
+			now = datetime.now()
+			dca.add_dcas([{'coin':'C%d' % i, 'amount':10, 'frequency':86400, 'start_time':now, 'strategy':'r'} for i in range(n_plans)])
+			due = dca.scheduler.pop_due(now)
+
+			async def timed_buy(coin, t):
+				start = time.perf_counter()
+				await dca.execute_buy(coin, t)
+				return time.perf_counter() - start
+
+			async def wakeup():
+				await core.prices.prefetch(['%s/%s' % (coin, dca.hold_coin) for t, coin in due])
+				return await asyncio.gather(*[timed_buy(coin, t) for t, coin in due])
+
+			async def reconciled():
+				while len(core.reconciler):
+					await asyncio.sleep(0.001)
+
+			t0 = time.perf_counter()
+			buy_times = sorted(run_sync(wakeup()))
+			placed = time.perf_counter() - t0
+			run_sync(reconciled())
+			final = time.perf_counter() - t0
+
+			dca.state.close()
+			dca.api.close()
+		finally:
+			os.chdir(cwd)
+
+	return {'placed':placed, 'final':final, 'p50':buy_times[len(buy_times) // 2], 'p99':buy_times[int(len(buy_times) * 0.99)],
+		'calls':dict(core.exchange.calls)}
+
+
+if __name__ == '__main__':
+	print('%8s %8s %8s %10s %10s %10s %10s  %s' % ('plans', 'latency', 'fail', 'placed (s)', 'final (s)', 'p50 (s)', 'p99 (s)', 'calls'))
+	for n_plans, latency, failure_rate in [(10, 0.02, 0), (100, 0.02, 0), (1000, 0.02, 0), (100, 0.1, 0), (100, 0.02, 0.05)]:
+		result = bench_buy_path(n_plans, latency, failure_rate)
+		print('%8d %8.2f %8.2f %10.3f %10.3f %10.3f %10.3f  %s' % (n_plans, latency, failure_rate, result['placed'], result['final'],
+			result['p50'], result['p99'], ' '.join('%s=%d' % call for call in sorted(result['calls'].items()))))
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from indicators import IndicatorState, batch
+
+
+"""
+Random walk of daily highs and closes
+"""
+def make_series(days=3000, seed=0):
+	rng = np.random.default_rng(seed)
+	closes = 10000 * np.exp(np.cumsum(rng.normal(0, 0.03, days)))
+	highs = closes * (1 + np.abs(rng.normal(0, 0.01, days)))
+	return highs, closes
+
+
+"""
+Feed the candles one wakeup (chunk candles) at a time, saving and loading the state as json between wakeups
+like the bot does across restarts, returns every value after every candle and the seconds per candle
+"""
+def stream(highs, closes, chunk=1):
+
+	state = IndicatorState()
+	values = {}
+	t0 = time.perf_counter()
+	for start in range(0, len(closes), chunk):
+		state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+		for i in range(start, min(start + chunk, len(closes))):
+			state.update(i, float(highs[i]), float(closes[i]))
+			for name, value in state.values().items():
+				values.setdefault(name, []).append(value)
+	elapsed = time.perf_counter() - t0
+	return {name:np.array(v) for name, v in values.items()}, elapsed / len(closes)
+
+
+if __name__ == '__main__':
+	print('%8s %8s %16s %16s %10s' % ('candles', 'chunk', 'stream (us/new)', 'batch (ms/all)', 'identical'))
+	for days in [500, 3000]:
+		highs, closes = make_series(days)
+		t0 = time.perf_counter()
+		expected = batch(highs, closes)
+		batch_t = time.perf_counter() - t0
+		for chunk in [1, 7, 100]:
+			streamed, per_candle = stream(highs, closes, chunk)
+
+			# Streaming has to give the same values as recomputing the whole history, to the bit
+			identical = all(np.array_equal(streamed[name], expected[name], equal_nan=True) for name in expected)
+			assert identical, [name for name in expected if not np.array_equal(streamed[name], expected[name], equal_nan=True)]
+			print('%8d %8d %16.2f %16.2f %10s' % (days, chunk, per_candle * 1e6, batch_t * 1000, identical))
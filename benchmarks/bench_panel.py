@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backtest import DCA, dca_panel
+from panel import Panel
+from bench_backtest import make_candles, timed
+
+
+"""
+Candles of n_coins random walks listed on different days (a coin every 5 days, over the first two years) as notebook style frames
+"""
+def make_frames(n_coins, days=365*4):
+	return {'C%d' % i:make_candles(days, seed=i).iloc[5*i % 730:] for i in range(n_coins)}
+
+
+"""
+Backtest every coin with one dca_panel call and with a DCA.get_average per coin, checks both buy the same
+Returns the seconds of the panel, of the loop and of building the panel
+"""
+def bench_panel(n_coins, freq=7, total=10000, weighting='fear_greed', repeat=5):
+
+	frames = make_frames(n_coins)
+	since = min(df.index[0] for df in frames.values()) - timedelta(days=1)
+	build_t, panel = timed(lambda: Panel.from_frames(frames, fields=('open', 'fear_greed')), 1)
+	panel_t, result = timed(lambda: dca_panel(panel, 100, freq, total, since=since, weighting=weighting), repeat)
+	loop_t, expected = timed(lambda: {coin:DCA(total, df, since=since).get_average(100, freq, coin, weighting) for coin, df in frames.items()}, repeat)
+
+	for coin, (volumes, spent, prices, dates, ret_df) in expected.items():
+		j = panel.col[coin]
+		buys = result['dollar_spend'][:, j] > 0
+		assert np.allclose(result['crypto_vol'][buys, j], volumes) and list(panel.index[buys]) == dates, coin
+		assert np.allclose(result['crypto_tot'][panel.index.get_indexer(ret_df.index), j], ret_df.crypto_tot.to_numpy()), coin
+
+	return panel_t, loop_t, build_t
+
+
+if __name__ == '__main__':
+	print('%8s %12s %12s %12s %10s' % ('coins', 'build (s)', 'panel (s)', 'loop (s)', 'speedup'))
+	for n_coins in [1, 10, 100, 500]:
+		panel_t, loop_t, build_t = bench_panel(n_coins)
+		print('%8d %12.4f %12.6f %12.6f %9.1fx' % (n_coins, build_t, panel_t, loop_t, loop_t / panel_t))
@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+import time
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from state_store import StateStore
+from trade_journal import TradeJournal
+from dca import DCA
+
+
+"""
+Benchmark saving and resuming a DCA holding n_trades trades over n_plans plans
+Returns seconds to record one trade (WAL append), to write a snapshot, the longest the trades lock was waited for
+while a snapshot was written (what order submits and fills wait) and to load the state back
+"""
+def bench_save_resume(n_trades, n_plans=100, appends=50):
+
+	with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+		dca = DCA('bench', simulate=True, api_keys={}, state_root=root, journal=TradeJournal(os.path.join(root, 'prev_trades')))
+		dca.hold_coin, dca.exchange_name = 'USDT', 'fake'
+		start = datetime(2020, 1, 1)
+		dca.add_dcas([{'coin':'C%d' % i, 'amount':10, 'frequency':86400, 'start_time':start, 'strategy':'r'} for i in range(n_plans)])
+
+		trades = {}
+		for i in range(n_trades):
+			coin = 'C%d' % (i % n_plans)
+			scheduled = start + timedelta(days=i // n_plans)
+			trades.setdefault(coin, []).append({'id':str(i), 'symbol':coin + '/USDT', 'side':'buy', 'amount':10 / (1 + i % 97), 'cost':10,
+				'price':1 + i % 97, 'timestamp':int(scheduled.timestamp() * 1000), 'scheduled':scheduled, 'fee':{'cost':0.01, 'currency':'USDT'},
+				'simulated':True})
+		dca.record_trades(trades)
+
+		t0 = time.perf_counter()
+		for i in range(appends):
+			dca.record_trade('C0', dict(trades['C0'][0], id='a%d' % i))
+		append = (time.perf_counter() - t0) / appends
+
+		# Let a snapshot started by the appends finish first
+		with dca.state.snapshotting:
+			pass
+		t0 = time.perf_counter()
+		dca.save()
+		snapshot = time.perf_counter() - t0
+
+		saving = threading.Thread(target=dca.save)
+		saving.start()
+		lock_wait = 0
+		while saving.is_alive():
+			t0 = time.perf_counter()
+			with dca.trades_lock:
+				lock_wait = max(lock_wait, time.perf_counter() - t0)
+			time.sleep(0.001)
+		saving.join()
+		dca.state.close()
+
+		t0 = time.perf_counter()
+		state = StateStore(root).load()
+		load = time.perf_counter() - t0
+		assert sum(len(t) for t in state['previous_buys'].values()) == n_trades + appends
+
+	return {'append':append, 'snapshot':snapshot, 'lock_wait':lock_wait, 'load':load}
+
+
+if __name__ == '__main__':
+	print('%10s %12s %14s %14s %10s' % ('trades', 'append (ms)', 'snapshot (ms)', 'lock wait (ms)', 'load (ms)'))
+	for n_trades in [1000, 10000, 100000]:
+		result = bench_save_resume(n_trades)
+		print('%10d %12.3f %14.1f %14.1f %10.1f' % (n_trades, result['append'] * 1000, result['snapshot'] * 1000, result['lock_wait'] * 1000, result['load'] * 1000))
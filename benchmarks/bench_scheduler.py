@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scheduler import Scheduler
+
+
+"""
+Benchmark the scheduler overhead per buy as the number of plans grows
+Every plan is due in one wakeup, each is popped and rescheduled a frequency later
+"""
+def bench_scheduler(n_plans, rounds=20):
+
+	random.seed(0)
+	start = datetime(2021, 1, 1)
+	frequencies = {'COIN%d' % i: random.choice([3600, 3600*24, 3600*24*7]) for i in range(n_plans)}
+	scheduler = Scheduler()
+	for coin in frequencies:
+		scheduler.schedule(coin, start + timedelta(seconds=random.randint(0, 3600)))
+
+	ops = 0
+	now = start + timedelta(hours=1)
+	t0 = time.perf_counter()
+	for _ in range(rounds):
+		for t, coin in scheduler.pop_due(now):
+			scheduler.schedule(coin, t + timedelta(seconds=frequencies[coin]))
+			ops += 1
+		now = scheduler.next_time()
+	elapsed = time.perf_counter() - t0
+
+	return elapsed / max(ops, 1) * 1e6, ops
+
+
+if __name__ == '__main__':
+	print('%8s %12s %12s' % ('plans', 'buys', 'us/buy'))
+	for n_plans in [10, 100, 1000, 10000]:
+		per_op, ops = bench_scheduler(n_plans)
+		print('%8d %12d %12.2f' % (n_plans, ops, per_op))
@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Run in a fresh interpreter: seconds to import dca, to build a DCA (ready for the first prompt) and to connect an exchange
+script = '''
+import sys, time, json
+t0 = time.perf_counter()
+from dca import DCA
+t1 = time.perf_counter()
+dca = DCA('startup', state_root=sys.argv[1], api_keys={'binance_keys':{'api_key':'', 'secret_key':''}})
+t2 = time.perf_counter()
+heavy = [name for name in ['numpy', 'pandas', 'requests', 'ccxt'] if name in sys.modules]
+dca.connect('binance')
+t3 = time.perf_counter()
+print(json.dumps({'import':t1 - t0, 'first_prompt':t2 - t0, 'connect':t3 - t2, 'heavy':heavy}))
+'''
+
+
+"""
+Median over repeat fresh interpreters of the import, first prompt and connect times, and the heavy libraries loaded
+before the first prompt (none should be)
+"""
+def bench_startup(repeat=5):
+
+	runs = []
+	with tempfile.TemporaryDirectory() as state_root:
+		for _ in range(repeat):
+			out = subprocess.run([sys.executable, '-c', script, state_root], cwd=root, capture_output=True, text=True, check=True).stdout
+			runs.append(json.loads(out.strip().splitlines()[-1]))
+	result = {key:statistics.median(run[key] for run in runs) for key in ['import', 'first_prompt', 'connect']}
+	result['heavy'] = sorted(set(name for run in runs for name in run['heavy']))
+	return result
+
+
+if __name__ == '__main__':
+	result = bench_startup()
+	print('%14s %14s %14s   %s' % ('import (s)', 'prompt (s)', 'connect (s)', 'loaded before the prompt'))
+	print('%14.4f %14.4f %14.4f   %s' % (result['import'], result['first_prompt'], result['connect'], ', '.join(result['heavy']) or 'nothing heavy'))
@@ -0,0 +1,172 @@
+import os
+import sys
+import math
+import time
+import random
+import asyncio
+import itertools
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ccxt.base.errors import NetworkError
+from apis.async_core import async_exchange_api, sync_exchange_api
+
+
+"""
+In process stand in for a ccxt async exchange so the adapters, the reconciler and the DCA run without network or keys
+Every call sleeps latency +- jitter seconds and fails with a NetworkError failure_rate of the time
+Orders fill fill_delay seconds after they are placed at the ask, prices follow a smooth deterministic curve per symbol
+"""
+class FakeExchange:
+
+	id = 'fake'
+	rateLimit = 1
+	has = {'fetchTickers':True, 'fetchOHLCV':True}
+
+	def __init__(self, n_markets=500, quote='USDT', latency=0.0, jitter=0.0, failure_rate=0.0, fill_delay=0.0, fee_rate=0.001, seed=0):
+		self.n_markets = n_markets
+		self.quote = quote
+		self.latency = latency
+		self.jitter = jitter
+		self.failure_rate = failure_rate
+		self.fill_delay = fill_delay
+		self.fee_rate = fee_rate
+		self.rng = random.Random(seed)
+		self.enableRateLimit = False
+		self.markets = None
+		self.orders = {}
+		self.order_ids = itertools.count(1)
+		self.calls = Counter()
+		self.coins = ['C%d' % i for i in range(n_markets)]
+		self.levels = {coin:1 + i % 97 for i, coin in enumerate(self.coins)}
+
+
+	# Sleep for the request latency and fail some of the time
+	async def _call(self, name):
+		self.calls[name] += 1
+		delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+		if delay > 0:
+			await asyncio.sleep(delay)
+		if self.failure_rate and self.rng.random() < self.failure_rate:
+			raise NetworkError('fake %s failed' % name)
+
+
+	"""
+	Price of a symbol at a unix time (s), a slow wave around a different level for every coin
+	"""
+	def price(self, symbol, t=None):
+		t = time.time() if t is None else t
+		level = self.levels[symbol.split('/')[0]]
+		return level * (1 + 0.1 * math.sin(t / 86400 + level))
+
+
+	def market(self, coin):
+		symbol = '%s/%s' % (coin, self.quote)
+		return {'id':coin + self.quote, 'symbol':symbol, 'base':coin, 'quote':self.quote, 'type':'spot', 'spot':True, 'active':True,
+			'precision':{'amount':6, 'price':8}, 'limits':{'amount':{'min':1e-5, 'max':None}, 'cost':{'min':1.0, 'max':None}}}
+
+
+	def set_markets(self, markets):
+		self.markets = {market['symbol']:market for market in markets}
+
+
+	async def fetch_markets(self):
+		await self._call('fetch_markets')
+		return [self.market(coin) for coin in self.coins]
+
+
+	async def fetch_ticker(self, symbol):
+		await self._call('fetch_ticker')
+		return self.ticker(symbol)
+
+
+	async def fetch_tickers(self, symbols=None):
+		await self._call('fetch_tickers')
+		return {symbol:self.ticker(symbol) for symbol in symbols or ['%s/%s' % (coin, self.quote) for coin in self.coins]}
+
+
+	def ticker(self, symbol):
+		price = self.price(symbol)
+		return {'symbol':symbol, 'timestamp':int(time.time() * 1000), 'bid':price * 0.9995, 'ask':price * 1.0005, 'last':price}
+
+
+	async def create_order(self, symbol, type, side, amount, price=None, params={}):
+		await self._call('create_order')
+		order_id = str(next(self.order_ids))
+		fill_price = self.price(symbol) * 1.0005
+		self.orders[order_id] = {'id':order_id, 'symbol':symbol, 'type':type, 'side':side, 'amount':amount, 'placed':time.time(),
+			'fill_price':fill_price}
+		return {'id':order_id, 'symbol':symbol, 'type':type, 'side':side, 'amount':amount, 'status':'open', 'filled':0,
+			'cost':None, 'price':None, 'fee':None, 'timestamp':int(time.time() * 1000)}
+
+
+	async def fetch_order(self, order_id, symbol=None):
+		await self._call('fetch_order')
+		order = self.orders[order_id]
+		if time.time() - order['placed'] < self.fill_delay:
+			return {'id':order_id, 'symbol':order['symbol'], 'status':'open', 'filled':0, 'cost':None, 'price':None}
+		cost = order['amount'] * order['fill_price']
+		return {'id':order_id, 'symbol':order['symbol'], 'status':'closed', 'filled':order['amount'], 'amount':order['amount'],
+			'cost':cost, 'price':order['fill_price'], 'average':order['fill_price'], 'fee':None}
+
+
+	async def fetch_my_trades(self, symbol, since=None, limit=None):
+		await self._call('fetch_my_trades')
+		trades = []
+		for order in self.orders.values():
+			if order['symbol'] == symbol and (since is None or order['placed'] * 1000 >= since):
+				cost = order['amount'] * order['fill_price']
+				trades.append({'id':'t' + order['id'], 'order':order['id'], 'symbol':symbol, 'amount':order['amount'], 'price':order['fill_price'],
+					'cost':cost, 'timestamp':int((order['placed'] + self.fill_delay) * 1000), 'fee':{'cost':cost * self.fee_rate, 'currency':self.quote}})
+		return trades
+
+
+	async def fetch_ohlcv(self, symbol, timeframe='1d', since=None, limit=500):
+		await self._call('fetch_ohlcv')
+		step = {'m':60, 'h':3600, 'd':86400}[timeframe[-1]] * int(timeframe[:-1]) * 1000
+		start = (since if since is not None else int(time.time() * 1000) - step * limit) // step * step
+		now = time.time() * 1000
+		candles = []
+		for t in range(start, start + step * limit, step):
+			if t > now:
+				break
+			o, c = self.price(symbol, t / 1000), self.price(symbol, (t + step) / 1000)
+			candles.append([t, o, max(o, c) * 1.001, min(o, c) * 0.999, c, 1000.0])
+		return candles
+
+
+	async def close(self):
+		pass
+
+
+"""
+Async adapter on a FakeExchange, exchange_options are passed to the FakeExchange
+"""
+class async_fake_api(async_exchange_api):
+
+	name = 'fake'
+	key_fields = {}
+	exchange_options = {}
+
+	def make_exchange(self, api_keys):
+		self.api_keys = {}
+		return FakeExchange(**self.exchange_options)
+
+
+class fake_api(sync_exchange_api):
+
+	core_class = async_fake_api
+
+
+"""
+fake_api class to connect a DCA to, with the latency, failure rate etc. of its FakeExchange
+"""
+def fake_api_class(**exchange_options):
+
+	class async_api(async_fake_api):
+		pass
+	async_api.exchange_options = exchange_options
+
+	class api(fake_api):
+		core_class = async_api
+	return api
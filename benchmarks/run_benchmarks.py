@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import platform
+import statistics
+import argparse
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_scheduler import bench_scheduler
+from bench_backtest import make_candles, timed
+from bench_buy_path import bench_buy_path
+from bench_save_resume import bench_save_resume
+from bench_panel import bench_panel
+from bench_startup import bench_startup
+from backtest import DCA
+
+
+"""
+Run the whole suite offline against the fake exchange and compare it with the saved baseline
+	python benchmarks/run_benchmarks.py          compare, exits 1 when a result is more than its tolerance times its baseline
+	python benchmarks/run_benchmarks.py --save   write the results as the new baseline
+Every result is in seconds, lower is better, and the median of --repeat runs of the suite
+"""
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Slowdowns counted as regressions by benchmark name prefix (--tolerance for the others), the ones timing microseconds,
+# small snapshots or new interpreters vary by up to 2x between runs of the same tree
+tolerances = {'scheduler_':2.5, 'state_1000_trades_':2.5, 'backtest_':2, 'startup_':2.5}
+
+
+def tolerance(name, default):
+	return next((value for prefix, value in tolerances.items() if name.startswith(prefix)), default)
+
+
+def run():
+
+	results = {}
+	for n_plans in [100, 10000]:
+		results['scheduler_%d_plans_per_buy' % n_plans] = bench_scheduler(n_plans)[0] / 1e6
+
+	for n_plans, latency, failure_rate in [(100, 0.02, 0), (100, 0.02, 0.05)]:
+		result = bench_buy_path(n_plans, latency, failure_rate)
+		name = 'buy_path_%d_plans%s' % (n_plans, '_failures' if failure_rate else '')
+		results[name + '_placed'] = result['placed']
+		results[name + '_final'] = result['final']
+
+	for n_trades in [1000, 100000]:
+		result = bench_save_resume(n_trades)
+		for key, value in result.items():
+			results['state_%d_trades_%s' % (n_trades, key)] = value
+
+	df = make_candles()
+	since = df.index[0] - timedelta(days=1)
+	for weighting in [None, 'fg_Logistic_steep']:
+		results['backtest_%s' % (weighting and 'fear_greed' or 'plain')] = timed(lambda: DCA(10000, df, since=since).get_average(100, 7, 'btc', weighting), 50)[0]
+	results['backtest_panel_100_coins'] = bench_panel(100)[0]
+
+	startup = bench_startup()
+	for key in ['import', 'first_prompt', 'connect']:
+		results['startup_%s' % key] = startup[key]
+
+	return results
+
+
+# Median of every result over repeat runs of the suite
+def run_median(repeat):
+	runs = [run() for _ in range(repeat)]
+	return {name:statistics.median(results[name] for results in runs) for name in runs[0]}
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='DCA bot benchmarks')
+	parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+	parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown over the baseline counted as a regression where tolerances has none')
+	parser.add_argument('--repeat', type=int, default=3, help='runs of the suite to take the median of')
+	args = parser.parse_args()
+
+	results = run_median(args.repeat)
+
+	if args.save:
+		with open(baseline_path, 'w') as f:
+			json.dump({'machine':'%s, Python %s' % (platform.platform(), platform.python_version()), 'results':results}, f, indent=2)
+		for name, value in results.items():
+			print('%-40s %12.6f' % (name, value))
+		print('Saved baseline to %s' % baseline_path)
+		sys.exit(0)
+
+	if not os.path.exists(baseline_path):
+		print('No baseline at %s, run with --save first' % baseline_path)
+		sys.exit(1)
+	with open(baseline_path) as f:
+		baseline = json.load(f)
+
+	print('Baseline from %s' % baseline['machine'])
+	print('%-40s %12s %12s %8s %6s' % ('benchmark', 'baseline', 'now', 'ratio', 'max'))
+	regressions = []
+	for name, value in results.items():
+		before = baseline['results'].get(name)
+		if before is None:
+			print('%-40s %12s %12.6f %8s' % (name, '-', value, 'new'))
+			continue
+		ratio = value / before if before else float('inf')
+		limit = tolerance(name, args.tolerance)
+		print('%-40s %12.6f %12.6f %7.2fx %5.1fx%s' % (name, before, value, ratio, limit, '  SLOWER' if ratio > limit else ''))
+		if ratio > limit:
+			regressions.append(name)
+
+	if regressions:
+		print('%d regressions over their tolerance: %s' % (len(regressions), ', '.join(regressions)))
+		sys.exit(1)
+	print('No regressions over the tolerances')
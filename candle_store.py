@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import asyncio
+from lazy import lazy_module
+
+np = lazy_module('numpy')
+
+
+"""
+Length of a candle interval like '1m' '4h' '1d' '1w' in milliseconds
+"""
+def interval_ms(interval):
+	units = {'s':1, 'm':60, 'h':3600, 'd':3600*24, 'w':3600*24*7, 'M':3600*24*30, 'y':3600*24*365}
+	return int(interval[:-1]) * units[interval[-1]] * 1000
+
+
+"""
+Convert loaded candle arrays to a DataFrame indexed by local datetime like the notebook's convert_pandas
+"""
+def candles_to_pandas(candles):
+	import pandas as pd
+	from tzlocal import get_localzone
+	index = pd.to_datetime(np.round(candles['timestamp'] / 1000), unit='s', utc=True).tz_convert(get_localzone()).tz_localize(None)
+	df = pd.DataFrame({k:np.asarray(v) for k,v in candles.items() if k != 'timestamp'}, index=index)
+	df.index.name = 'timestamp'
+	return df
+
+
+"""
+On disk store of OHLCV candles with one directory per (exchange, symbol, interval)
+Every column is a raw little endian binary file which is only ever appended to and is memory mapped to load
+meta.json holds the number of complete rows so a write cut off halfway is ignored and overwritten
+"""
+class CandleStore:
+
+	columns = [('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')]
+
+	def __init__(self, root='candles'):
+		self.root = root
+
+
+	# Directory for one set of candles
+	def path(self, exchange, symbol, interval):
+		return os.path.join(self.root, exchange, symbol.replace('/', '_'), interval)
+
+
+	"""
+	Number of stored candles and the timestamp of the last one
+	"""
+	def meta(self, exchange, symbol, interval):
+		try:
+			with open(os.path.join(self.path(exchange, symbol, interval), 'meta.json'), 'r') as json_file:
+				return json.load(json_file)
+		except FileNotFoundError:
+			return {'count':0, 'first':None, 'last':None}
+
+
+	"""
+	Timestamp (ms) of the last stored candle or None
+	"""
+	def last_timestamp(self, exchange, symbol, interval):
+		return self.meta(exchange, symbol, interval)['last']
+
+
+	"""
+	Memory map the stored candles between since and until (ms timestamps, inclusive)
+	Returns a dictionary of column arrays, nothing is read from disk until the arrays are used
+	"""
+	def load(self, exchange, symbol, interval, since=None, until=None):
+
+		path = self.path(exchange, symbol, interval)
+		count = self.meta(exchange, symbol, interval)['count']
+		candles = {}
+		for name, dtype in self.columns:
+			if count:
+				candles[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode='r', shape=(count,))
+			else:
+				candles[name] = np.empty(0, dtype=dtype)
+
+		# Slice to the requested time range
+		start = 0 if since is None else np.searchsorted(candles['timestamp'], since, side='left')
+		end = count if until is None else np.searchsorted(candles['timestamp'], until, side='right')
+		return {name:array[start:end] for name, array in candles.items()}
+
+
+	"""
+	Append candles [[timestamp, open, high, low, close, volume], ...] keeping only those newer than the last stored one
+	Returns the number of candles added
+	"""
+	def append(self, exchange, symbol, interval, candles):
+
+		meta = self.meta(exchange, symbol, interval)
+		data = np.asarray(candles, dtype=float).reshape(-1, len(self.columns))
+		if meta['last'] is not None:
+			data = data[data[:,0] > meta['last']]
+		if not len(data):
+			return 0
+
+		# Candles have to be in order with no duplicates
+		data = data[np.argsort(data[:,0], kind='stable')]
+		data = data[np.concatenate(([True], np.diff(data[:,0]) > 0))]
+
+		path = self.path(exchange, symbol, interval)
+		os.makedirs(path, exist_ok=True)
+		for i, (name, dtype) in enumerate(self.columns):
+			with open(os.path.join(path, name + '.bin'), 'ab') as column_file:
+				column_file.truncate(meta['count'] * np.dtype(dtype).itemsize)
+				column_file.write(data[:,i].astype(dtype).tobytes())
+
+		# Commit the new rows by replacing meta.json
+		meta = {'count':meta['count'] + len(data), 'first':meta['first'] if meta['first'] is not None else int(data[0,0]), 'last':int(data[-1,0])}
+		with open(os.path.join(path, 'meta.json.tmp'), 'w') as json_file:
+			json.dump(meta, json_file)
+		os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+
+		return len(data)
+
+
+	"""
+	Missing candles in the stored data as [[last timestamp before the gap, first timestamp after], ...]
+	"""
+	def gaps(self, exchange, symbol, interval):
+		timestamps = self.load(exchange, symbol, interval)['timestamp']
+		breaks = np.flatnonzero(np.diff(timestamps) > interval_ms(interval))
+		return [[int(timestamps[i]), int(timestamps[i+1])] for i in breaks]
+
+
+	"""
+	Fetch the candles newer than the last stored one from a ccxt exchange and append them
+	since (ms) is only used when nothing is stored yet, the candle still forming is not stored
+	Returns the number of candles added
+	"""
+	def update(self, exchange, symbol, interval='1d', since=None):
+
+		last = self.last_timestamp(exchange.id, symbol, interval)
+		start = last + 1 if last is not None else since
+		step = interval_ms(interval)
+		added = 0
+
+		while 1:
+			page = exchange.fetch_ohlcv(symbol, interval, since=start)
+			now = time.time() * 1000
+			page = [candle for candle in page if candle[0] + step <= now]
+			if not page:
+				break
+			added += self.append(exchange.id, symbol, interval, page)
+			if page[-1][0] < start:
+				break
+			start = page[-1][0] + 1
+
+		return added
+
+
+	"""
+	update for coroutines, request is an async function like the exchange adapters' request(method, *args, **kwargs)
+	so the downloads of many symbols can run at once under the adapter's rate limit
+	Every page is appended as it arrives so an interrupted download carries on from the last stored candle
+	Stops after the candle starting at until (ms) when it's given, limit is the number of candles per page to ask for
+	"""
+	async def update_async(self, request, exchange_id, symbol, interval='1d', since=None, until=None, limit=None):
+
+		last = self.last_timestamp(exchange_id, symbol, interval)
+		start = last + 1 if last is not None else since
+		step = interval_ms(interval)
+		added = 0
+
+		while until is None or start is None or start <= until:
+			page = await request('fetch_ohlcv', symbol, interval, since=start, **({'limit':limit} if limit else {}))
+			now = time.time() * 1000
+			page = [candle for candle in page if candle[0] + step <= now and (until is None or candle[0] <= until)]
+			if not page:
+				break
+			added += await asyncio.to_thread(self.append, exchange_id, symbol, interval, page)
+			if start is not None and page[-1][0] < start:
+				break
+			start = page[-1][0] + 1
+
+		return added
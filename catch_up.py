@@ -0,0 +1,150 @@
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+import strategies
+from lazy import lazy_module
+from apis.event_loop import run_sync
+from candle_store import CandleStore, interval_ms
+
+np = lazy_module('numpy')
+
+
+"""
+Every wakeup slot missed from wakeup_time up to now for a plan bought every frequency seconds
+"""
+def missed_slots(wakeup_time, frequency, now):
+	if wakeup_time > now:
+		return []
+	return [wakeup_time + timedelta(seconds=frequency * k) for k in range(int((now - wakeup_time).total_seconds() // frequency) + 1)]
+
+
+"""
+Catch up on the buys a DCA missed while it was stopped
+Every missed slot of every plan gets the amount its strategy would have given then (the fear and greed value of that day,
+the indicators of the candles up to then)
+and the price of the candle it fell in, the candles of all the coins are downloaded at once into the candle store
+Policies:
+	'buy'  one order per plan for the sum of its missed amounts at the current price, all placed concurrently
+	'book' a simulated fill per missed slot at its historical price, no orders are placed
+	'skip' nothing is bought
+"""
+class CatchUp:
+
+	policies = ['buy', 'book', 'skip']
+
+	def __init__(self, dca, interval='1h', store=None):
+		self.dca = dca
+		self.interval = interval
+		self.store = store or CandleStore()
+
+
+	"""
+	Missed slots of each plan from the saved wakeup times [[datetime, coin], ...]
+	Returns {coin: {'slots':[datetime, ...], 'amounts':[...], 'next':next wakeup}} for the plans that missed buys
+	"""
+	def plan(self, wakeup_times, now=None):
+
+		now = now or datetime.now()
+		missed = {}
+		for wakeup_time, coin in wakeup_times:
+			dca_plan = self.dca.dca_dict[coin]
+			slots = missed_slots(wakeup_time, dca_plan['frequency'], now)
+			if slots:
+				missed[coin] = {'slots':slots, 'next':slots[-1] + timedelta(seconds=dca_plan['frequency'])}
+
+		# Fear and greed days that aren't stored yet are fetched once for all the plans
+		if any('fear_greed' in strategies.get(self.dca.dca_dict[coin]['function']['name']).inputs for coin in missed):
+			try:
+				self.dca.fg_history.refresh()
+			except Exception as e:
+				print('Error updating fear and greed history: %s' % e)
+			if not self.dca.fg_history.values:
+				print('No fear and greed history, missed fear and greed buys are unweighted')
+		# The indicators of the missed slots need the candles up to now
+		indicator_coins = [coin for coin in missed if self.dca.uses_indicators(coin)]
+		if indicator_coins:
+			run_sync(self.dca.refresh_candles(indicator_coins))
+		for coin, plan in missed.items():
+			plan['amounts'] = [self.dca.weigh(coin, self.dca.dca_dict[coin]['amount'], at=slot) for slot in plan['slots']]
+
+		return missed
+
+
+	# One line per plan describing what was missed
+	def summary(self, missed):
+		return '\n'.join('%s: %d buys missed since %s, $%.2f weighted' % (coin, len(plan['slots']), plan['slots'][0].strftime('%b %d %H:%M'), sum(plan['amounts']))
+			for coin, plan in missed.items())
+
+
+	"""
+	Catch up on the missed buys with a policy, returns {coin: [trade, ...]} to record
+	"""
+	async def run(self, missed, policy):
+
+		if policy == 'skip' or not missed:
+			return {}
+		if policy == 'buy':
+			coins = list(missed)
+			trades = await asyncio.gather(*[self.buy(coin, sum(missed[coin]['amounts']), len(missed[coin]['slots'])) for coin in coins])
+			return {coin:[trade] for coin, trade in zip(coins, trades) if trade is not None}
+		if policy == 'book':
+			await self.download(missed)
+			booked = await asyncio.gather(*[self.book(coin, plan) for coin, plan in missed.items()], return_exceptions=True)
+			for coin, trades in zip(missed, booked):
+				if isinstance(trades, Exception):
+					print('Error booking missed buys of %s: %s' % (coin, trades))
+			return {coin:trades for coin, trades in zip(missed, booked) if not isinstance(trades, Exception)}
+		raise ValueError('Unknown catch up policy %s' % policy)
+
+
+	# Place the combined order of one plan
+	async def buy(self, coin, amount, slots):
+		try:
+			async with self.dca.order_slots:
+				print('Catching up on %d buys of %s: $%.2f' % (slots, coin, amount))
+				return await self.dca.buy_async(coin, amount, fields={'catch_up':slots})
+		except Exception as e:
+			print('Error catching up on %s\n%s' % (coin, traceback.format_exc()))
+
+
+	"""
+	Download the candles covering the missed slots of every plan at once
+	"""
+	async def download(self, missed):
+
+		core = self.dca.api.core
+		step = interval_ms(self.interval)
+		results = await asyncio.gather(*[self.store.update_async(core.request, core.name, '%s/%s' % (coin, self.dca.hold_coin), self.interval,
+			since=int(plan['slots'][0].timestamp() * 1000) - step) for coin, plan in missed.items()], return_exceptions=True)
+		for coin, result in zip(missed, results):
+			if isinstance(result, Exception):
+				print('Error downloading %s candles for catching up: %s' % (coin, result))
+
+
+	"""
+	Simulated fills of one plan's missed slots at the open of the candle each slot fell in
+	Slots after the last complete candle use the current price
+	"""
+	async def book(self, coin, plan):
+
+		ticker = '%s/%s' % (coin, self.dca.hold_coin)
+		core = self.dca.api.core
+		step = interval_ms(self.interval)
+		slot_ms = np.array([slot.timestamp() * 1000 for slot in plan['slots']])
+		candles = self.store.load(core.name, ticker, self.interval, since=int(slot_ms[0]) - step)
+		timestamps, opens = np.asarray(candles['timestamp']), np.asarray(candles['open'])
+
+		index = np.searchsorted(timestamps, slot_ms, side='right') - 1
+		in_candle = (index >= 0) & (slot_ms < timestamps[np.maximum(index, 0)] + step) if len(timestamps) else np.zeros(len(slot_ms), dtype=bool)
+		current = await self.dca.prices.ask(ticker) if not in_candle.all() else None
+
+		trades = []
+		for slot, ms, amount, i, found in zip(plan['slots'], slot_ms, plan['amounts'], index, in_candle):
+			price = float(opens[i]) if found else current
+			trades.append({'symbol':ticker, 'side':'buy', 'amount':amount / price, 'cost':amount, 'price':price,
+				'timestamp':int(ms), 'scheduled':slot, 'catch_up':1, 'simulated':True})
+		# Every weight can be 0 (extreme greed) so there may be nothing to average
+		bought = sum(t['amount'] for t in trades)
+		average = ' at an average of %.8f' % (sum(plan['amounts']) / bought) if bought else ''
+		print('Booked %d missed buys of %s: $%.2f%s' % (len(trades), coin, sum(plan['amounts']), average))
+		return trades
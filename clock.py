@@ -0,0 +1,71 @@
+import time
+import asyncio
+from datetime import datetime
+
+
+"""
+Wall clock the DCA schedules on, sleeping waits for the next buy or a wakeup event, start is when it was made
+"""
+class Clock:
+
+	virtual = False
+
+	def __init__(self):
+		self.start = datetime.now()
+
+
+	def now(self):
+		return datetime.now()
+
+
+	def time(self):
+		return time.time()
+
+
+	"""
+	Sleep until t (None sleeps until woken) or until the event is set
+	"""
+	async def sleep_until(self, t, event, tasks):
+		timeout = None if t is None else max(0, (t - datetime.now()).total_seconds())
+		try:
+			await asyncio.wait_for(event.wait(), timeout=timeout)
+		except asyncio.TimeoutError:
+			pass
+
+
+"""
+Clock for replaying history, sleeping jumps straight to the next buy once the buys running at the current time are done
+Time stops at end (or when nothing is scheduled), finished is set then
+"""
+class VirtualClock(Clock):
+
+	virtual = True
+
+	def __init__(self, start, end=None):
+		self.start = start
+		self.current = start
+		self.end = end
+		self.finished = asyncio.Event()
+
+
+	def now(self):
+		return self.current
+
+
+	def time(self):
+		return self.current.timestamp()
+
+
+	async def sleep_until(self, t, event, tasks):
+
+		# The buys started now have to get their prices before the time moves on
+		while tasks:
+			await asyncio.gather(*list(tasks), return_exceptions=True)
+		if event.is_set():
+			return
+
+		if t is None or (self.end is not None and t > self.end):
+			self.finished.set()
+			await event.wait()
+			return
+		self.current = max(self.current, t)
@@ -1,19 +1,60 @@
+import copy
+import contextlib
 import json
+import math
 import traceback
-import requests
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import threading
-import numpy as np
+import time
+import signal
+import atexit
+import asyncio
 import sys
 import queue
 from save import *
+from scheduler import Scheduler
+from clock import Clock
+from fear_greed import FearGreedHistory
+from trade_journal import TradeJournal
+from state_store import StateStore
+from plan_stats import PlanStats
+from catch_up import CatchUp
+from indicators import IndicatorEngine
+import strategies
+from metrics import metrics
 from pprint import pprint
-from apis.binance_api import *
-from apis.ftx_api import *
-from apis.kraken_api import *
-from apis.kucoin_api import *
-from apis.mexc_api import *
+from apis.event_loop import get_loop, spawn, run_sync
+from apis.price_feed import make_price_feed
+from apis.registry import exchanges, load_api
+from lazy import preload
+
+
+"""
+Number of seconds in a frequency like 20S/12H/3D/1W (Seconds/Minutes/Hours/Days/Weeks), raises ValueError if it isn't one
+"""
+def parse_frequency(freq_str):
+
+	scales = {'s':1, 'm':60, 'h':3600, 'd':3600 * 24, 'w':3600 * 24 * 7}
+	if not freq_str[:-1].replace('.','').isnumeric() or freq_str[-1].lower() not in scales:
+		raise ValueError('Incorrect frequency %s' % freq_str)
+	return float(freq_str[:-1]) * scales[freq_str[-1].lower()]
+
+
+"""
+Start time from a local 24H time like 19:00 (the next one to come) or an ISO datetime, now if blank
+"""
+def parse_start_time(text):
+
+	if not text:
+		return datetime.now()
+	if len(text) <= 5:
+		hours, minutes = text.split(':')
+		start_time = datetime.now().replace(hour=int(hours), minute=int(minutes), second=0, microsecond=0)
+		if start_time < datetime.now():
+			start_time += timedelta(days=1)
+		return start_time
+	return datetime.fromisoformat(text)
 
 
 """
@@ -21,95 +62,181 @@ Class to manage a DCA strategy
 """
 class DCA:
 
-	def __init__(self, name='dca_1', simulate=True, log=False):
+	# Exchanges by their short name in the prompt, the adapters are imported by load_api when connecting
+	exchange_dict = {v['short']:v for v in exchanges.values()}
+
+	def __init__(self, name='dca_1', simulate=True, log=False, order_workers=16, state_root='saved_dca', journal=None, api_keys=None, price_feed=None, record_prices=None, clock=None):
 
 		self.crypto_amounts = {}
+		self.carry = {} # {coin: amount too small to buy yet}
 		self.hold_coin = 'USDT'
 		self.previous_buys = {}
-		self.wakeup_event = threading.Event()
+		self.plan_stats = {}
+		self.trades_lock = threading.RLock()
+		self.order_slots = asyncio.Semaphore(order_workers)
+		self.order_tasks = set()
+		self.wakeup_event = asyncio.Event()
 		self.dca_name = name
 		self.simulate = simulate
-		self.wakeup_times = [] # [[datetime1, coin1], [datetime2, coin2]]
-		self.strategies = {'r':{'func':lambda x : x,'name':'regular dca'}, 'f':{'func':self.fear_greed, 'name':'fear_greed'}}
+		self.price_feed = price_feed # Where simulated buys get their prices, see make_price_feed
+		self.record_prices = record_prices
+		self.feed = None
+		self.scheduler = Scheduler()
+		self.clock = clock or Clock() # A VirtualClock replays history, see replay.py
+		self.indicators = IndicatorEngine(root=os.path.join(state_root, 'indicators'))
+
+		# Value of each strategy input for a coin at a time (None for now)
+		self.inputs = {'fear_greed':lambda coin, at : self.fear_greed(at)}
+		for input_name in self.indicators.names:
+			self.inputs[input_name] = lambda coin, at, input_name=input_name : self.indicator(coin, input_name, at)
 		self.dca_dict = {}
 		self.start_time = datetime.now()
 		self.log = log
-		self.fg_pull = None
+		self.fg_history = FearGreedHistory()
+		self.journal = journal or TradeJournal()
+		self.state = StateStore(state_root, snapshot_state=self.state_dict, lock=self.trades_lock)
 		self.current_prompt = ''
-		self.exchange_apis = {'binance':binance_api, 'ftx':ftx_api, 'kraken':kraken_api, 'kucoin':kucoin_api, 'mexc':mexc_api }
-		self.exchange_dict = {'b':{'api':binance_api,'hold':'USDT', 'name':'binance'}, 'f':{'api':ftx_api, 'hold':'USD', 'name':'ftx'}, 'kr': {'api':kraken_api, 'hold':'USD','name':'kraken'}, 'ku': {'api':kucoin_api, 'hold':'USDT','name':'kucoin'}, 'm': {'api':mexc_api, 'hold':'USDT','name':'mexc'}}
-		self.save_keys = ['dca_name','crypto_amounts','hold_coin','previous_buys','simulate','wakeup_times','dca_dict','start_time','log','exchange_name']
+		self.save_keys = ['dca_name','crypto_amounts','hold_coin','previous_buys','simulate','wakeup_times','dca_dict','start_time','log','exchange_name','carry']
+
+		# Queue depths read when the metrics are scraped, labelled by this dca and removed again in shutdown
+		self.gauges = {
+			'scheduled_plans': lambda : len(self.scheduler),
+			'running_buys': lambda : len(self.order_tasks),
+			'journal_buffer': lambda : len(self.journal.buffer),
+		}
+		self.gauge_labels = {'dca':name}
+		for gauge, func in self.gauges.items():
+			metrics.gauge(gauge, func, **self.gauge_labels)
+		self._api_keys = api_keys
+
+
+	# Keys are read from keys.json one directory above the repo when connecting unless they are given
+	@property
+	def api_keys(self):
+		if self._api_keys is None:
+			with open('../keys.json', 'r') as json_file:
+				self._api_keys = json.load(json_file)
+		return self._api_keys
 
-		with open('../keys.json', 'r') as json_file:
-			self.api_keys = json.load(json_file)
-			
 
 	"""
-	Manage dca in a loop with an event to wakeup to buy
+	Manage dca in a loop on the shared event loop with an event to wakeup to buy
 	"""
-	def manage_dcas(self):
-
-		sleeptime = None
+	async def manage_dcas(self):
 
 		while 1:
 			try:
+				# Sleep until the earliest plan is due or a new plan is added
 				self.wakeup_event.clear()
-				self.wakeup_event.wait(timeout=None if not sleeptime else max(0, sleeptime))
-				t, coin = self.wakeup_times.pop(0)
+				await self.clock.sleep_until(self.scheduler.next_time(), self.wakeup_event, self.order_tasks)
+
+				# Fire every plan that is due in this wakeup
+				due = self.scheduler.pop_due(self.clock.now())
+				if not due:
+					continue
+				metrics.inc('wakeups_total', dca=self.dca_name)
 
 				# Clear the previous input prompt text and bring it to the bottom
 				for i in range(self.current_prompt.count('\n')):
 					sys.stdout.write('\x1b[1A')
 					sys.stdout.write('\x1b[2K')
 
-				print('\n\n%s Woken up %s %s\n' % ('*'*20, datetime.now().strftime('%b %m %H:%M:%S'), '*'*20))
-				if t < datetime.now():
-					try:
-						# Execute the buy
-						amount = self.dca_dict[coin]['function']['func'](self.dca_dict[coin]['amount'])
-
-						print('Buying $%.2f' % (amount))
-						trade = self.buy(coin, amount)	
-						self.previous_buys[coin].append(trade)
-					except Exception as e:
-						print('Error buying %s\n%s\n\nContinuing' % (coin, traceback.format_exc()))
-					next_buy = t + timedelta(seconds=self.dca_dict[coin]['frequency'])
+				print('\n\n%s Woken up %s %s\n' % ('*'*20, self.clock.now().strftime('%b %m %H:%M:%S'), '*'*20))
 
-				else:
-					# Just add next buy time
-					next_buy = t
+				# Get the prices of all the coins due in one request
+				try:
+					await self.prices.prefetch(['%s/%s' % (coin, self.hold_coin) for t, coin in due])
+				except Exception as e:
+					print('Error prefetching prices: %s' % e)
+					metrics.inc('errors_total', where='prefetch')
+				await self.refresh_candles([coin for t, coin in due])
 
-				print('\nNext buy of %s: %s' % (coin, next_buy.strftime('%b %d %H:%M:%S')))
-				self.wakeup_times.append([next_buy, coin])
+				# Start the buys as tasks and schedule the next ones straight away
+				moved = []
+				for t, coin in due:
+					task = asyncio.ensure_future(self.execute_buy(coin, t))
+					self.order_tasks.add(task)
+					task.add_done_callback(self.order_tasks.discard)
 
-				self.wakeup_times.sort()
-				
-				if self.wakeup_times[0][0] > datetime.now():
-					sleeptime = (self.wakeup_times[0][0] - datetime.now()).total_seconds()
-				else:
-					sleeptime = 0.1
+					next_buy = t + timedelta(seconds=self.dca_dict[coin]['frequency'])
+					print('\nNext buy of %s: %s' % (coin, next_buy.strftime('%b %d %H:%M:%S')))
+					self.scheduler.schedule(coin, next_buy)
+					moved.append({'op':'wakeup', 'coin':coin, 'time':next_buy})
+				await asyncio.to_thread(self.state.log, *moved)
 
+				next_time = self.scheduler.next_time()
+				sleeptime = max(0, (next_time - self.clock.now()).total_seconds())
 				print('\n%s  Sleeping for: %.2fs  %s\n\n %s' % ('-'*20, sleeptime, '-'*20, self.current_prompt))
 
 			except Exception as e:
 				print('Error\n\n %s\n\nContinuing' % (traceback.format_exc()))
+				metrics.inc('errors_total', where='manage_dcas')
+
+
+	"""
+	Wake up the scheduler from any thread
+	"""
+	def wake(self):
+		get_loop().call_soon_threadsafe(self.wakeup_event.set)
+
+
+	"""
+	Execute a scheduled buy as a task on the event loop and record how late it started
+	At most order_workers buys run at once, the exchange adapter limits the requests
+	"""
+	async def execute_buy(self, coin, t):
+
+		lag = (self.clock.now() - t).total_seconds()
+		metrics.observe('scheduler_lag_seconds', lag, dca=self.dca_name)
+		try:
+			async with self.order_slots:
+				# The strategy can block on a download so it runs on a worker thread
+				amount = await asyncio.to_thread(self.weigh, coin, self.dca_dict[coin]['amount'])
+
+				print('Buying $%.2f of %s (%.2fs after scheduled)' % (amount, coin, lag))
+				trade = await self.buy_async(coin, amount, fields={'scheduled':t, 'lag':lag})
+			if trade is not None:
+				await asyncio.to_thread(self.record_trade, coin, trade)
+		except Exception as e:
+			print('Error buying %s\n%s\n\nContinuing' % (coin, traceback.format_exc()))
+			metrics.inc('errors_total', where='execute_buy')
+
+
+	"""
+	Add the trade to the coin's previous buys and the state log
+	Simulated trades are counted in the stats now, live ones once the reconciler has their fills
+	"""
+	def record_trade(self, coin, trade):
+		self.record_trades({coin:[trade]})
+
+
+	# Record the trades of many coins {coin: [trade, ...]} with one state log write
+	def record_trades(self, trades):
+		with self.trades_lock:
+			records = []
+			for coin, coin_trades in trades.items():
+				for trade in coin_trades:
+					self.previous_buys[coin].append(trade)
+					if trade is not None and 'dca_status' not in trade:
+						self.plan_stats[coin].add(trade)
+					records.append({'op':'trade', 'coin':coin, 'trade':trade})
+			if records:
+				self.state.log(*records)
 
 
 	"""
 	Start a dca and print the parameters
 	"""
-	def add_dca(self, coin, amount, frequency, start_time, strategy, freq_str):
+	def add_dca(self, coin, amount, frequency, start_time, strategy, freq_str, params=None):
 
 		if coin in self.dca_dict:
 			print('%s Already executing dca with this coin' % (coin))
 		else:
-			self.dca_dict[coin] = {'amount':amount, 'frequency':frequency, 'start_time':start_time, 'function':{'name':strategy, 'func':self.strategies[strategy]['func']}}
-			
 			# Print out the strategy
 			coin_str = ('Coin', coin)
 			amount_str = ('Buy Amount', '$%.2f' % amount)
 			freq_str = ('Frequency', freq_str)
-			strategy_str = ('Strategy', self.strategies[strategy]['name']) 
+			strategy_str = ('Strategy', strategies.get(strategy).description)
 			start_str = ('Start Time', start_time.strftime('%b %d - %H:%M:%S'))
 			dca_str = '  %s\n  *            DCA PARAMS           *' % ('*'*35)
 			dca_str += '\n  * %s:%s *' % (coin_str[0], (' '*(30 - len(coin_str[0]) - len(coin_str[1]))) + coin_str[1])
@@ -120,152 +247,329 @@ class DCA:
 			dca_str += '\n  %s\n\n' % ('*' * 35)
 			print(dca_str)
 
-			self.previous_buys[coin] = []
+			self.add_dcas([{'coin':coin, 'amount':amount, 'frequency':frequency, 'start_time':start_time, 'strategy':strategy, 'params':params}])
+
 
-			# Put the start time in the wakeup_queue and wakeup the event
-			self.wakeup_times.append([start_time, coin])
-			self.wakeup_times.sort()
-			self.wakeup_event.set()
+	"""
+	Start many dcas [{'coin', 'amount', 'frequency' (s), 'start_time', 'strategy', 'params' (optional)}, ...] with one state log write and heap rebuild
+	The strategy is saved by name with its parameters (the defaults filled in)
+	Returns the number of plans added, coins that already have a dca are skipped
+	"""
+	def add_dcas(self, plans):
+
+		records = [{'op':'set', 'fields':self.settings()}]
+		wakeups = []
+		with self.trades_lock:
+			for plan in plans:
+				coin = plan['coin']
+				if coin in self.dca_dict:
+					continue
+				strategy = strategies.get(plan['strategy'])
+				function = {'name':strategy.name, 'params':strategy.check(plan.get('params'))}
+				self.dca_dict[coin] = {'amount':plan['amount'], 'frequency':plan['frequency'], 'start_time':plan['start_time'], 'function':function}
+				self.previous_buys[coin] = []
+				self.plan_stats[coin] = PlanStats()
+				records += [{'op':'plan', 'coin':coin, 'plan':self.dca_dict[coin]}, {'op':'wakeup', 'coin':coin, 'time':plan['start_time']}]
+				wakeups.append([plan['start_time'], coin])
+
+			# Put the start times in the scheduler and wakeup the event
+			self.scheduler.schedule_many(wakeups)
+			if wakeups:
+				self.state.log(*records)
+		self.wake()
+		return len(wakeups)
 		
 
 	"""
-	Buy the coin
+	Buy the coin, blocking until the order is placed (the same path as buy_async, with the carry and market minimum)
+	Live orders are returned once placed and logged when the reconciler has their fills and fees
 	"""
 	def buy(self, coin, amount):
+		return run_sync(self.buy_async(coin, amount))
+
+
+	"""
+	Buy the coin from the event loop
+	Amounts below the market minimum are carried to the next buy of the coin instead of being skipped or rounded up,
+	an order is only placed once the carried total clears the minimum, returns None when nothing was bought
+	fields are set on the trade before it is logged or reconciled
+	"""
+	async def buy_async(self, coin, amount, fields=None):
 
 		ticker = '%s/%s' % (coin, self.hold_coin)
+		total = amount + self.carry.get(coin, 0)
+		price = await self.prices.ask(ticker)
+		minimum = await self.api.core.min_buy_cost(ticker, price)
+		if total < minimum:
+			print('$%.2f of %s is below the $%.2f minimum, carrying it to the next buy' % (total, coin, minimum))
+			metrics.inc('carried_buys_total', dca=self.dca_name)
+			await asyncio.to_thread(self.set_carry, coin, total)
+			return None
+
 		if self.simulate:
-			trade = self.api.simulate_buy(ticker, amount)
+			trade = await self.api.core.simulate_buy(ticker, total, price)
+			trade.update(fields or {})
+			if self.log:
+				await asyncio.to_thread(self.save_trade, trade, ticker)
 		else:
-			trade = self.api.buy(ticker, amount)
+			trade = await self.api.core.buy(ticker, total, on_final=self.trade_logger(ticker), fields=fields)
 
-		if self.log:
-			self.save_trade(trade, ticker)
+		if trade is not None:
+			metrics.inc('buys_total', dca=self.dca_name)
 
+		# Whatever the order didn't spend (rounding to the step size) goes to the next buy
+		carry = total if trade is None else trade.get('dca_carry', 0)
+		if carry or self.carry.get(coin):
+			await asyncio.to_thread(self.set_carry, coin, carry)
 		return trade
 
 
+	# Amount carried to the next buy of a coin
+	def set_carry(self, coin, amount):
+		with self.trades_lock:
+			self.carry[coin] = amount
+			self.state.log({'op':'carry', 'coin':coin, 'amount':amount})
+
+
+	# Callback to record a live trade again once it is final and log it
+	def trade_logger(self, ticker):
+		def on_final(trade):
+			with self.trades_lock:
+				self.plan_stats[ticker.split('/')[0]].add(trade)
+				self.state.log({'op':'trade', 'coin':ticker.split('/')[0], 'trade':trade})
+			if self.log:
+				self.save_trade(trade, ticker)
+		return on_final
+
+
+	"""
+	Connect to the exchange with its adapter class or name (the adapter is imported then)
+	"""
+	def connect(self, api_class):
+		if isinstance(api_class, str):
+			api_class = load_api(api_class)
+		self.api = api_class(self.api_keys)
+
+
+	"""
+	Quotes for buying, the exchange's for live buys and the price feed shared by all the plans when simulating
+	"""
+	@property
+	def prices(self):
+		if not self.simulate:
+			return self.api.core.prices
+		if self.feed is None:
+			self.feed = make_price_feed(self.price_feed, self.api.core, self.record_prices, self.clock)
+		return self.feed
+
+
+	"""
+	Amount to buy of a coin, the plan's amount weighted by its strategy
+	at is a past buy time (catching up on missed buys) to weight with the inputs of that time instead of the latest,
+	replays use the time being replayed, the amount is unweighted if an input can't be had
+	"""
+	def weigh(self, coin, amount, at=None):
+
+		function = self.dca_dict[coin]['function']
+		strategy = strategies.get(function['name'])
+		if at is None and self.clock.virtual:
+			at = self.clock.now()
+		try:
+			values = {name:self.inputs[name](coin, at) for name in strategy.inputs}
+			missing = [name for name, value in values.items() if value is None]
+			if missing:
+				raise ValueError('No %s for %s at %s' % (', '.join(missing), coin, at or 'now'))
+			weight = strategy.weight(values, **function['params'])
+			if not math.isfinite(weight):
+				raise ValueError('No %s weight for %s yet, not enough history' % (strategy.name, coin))
+			if at is None and strategy.inputs:
+				print('Investment multiplier: %.4f' % (weight))
+		except Exception as e:
+			weight = 1
+			if at is None:
+				print('Error: %s' % e)
+
+		return weight * amount
+
+
+	# Value of an indicator of a coin's candles (see IndicatorEngine.value)
+	def indicator(self, coin, name, at=None):
+		return self.indicators.value(self.api.core.name, '%s/%s' % (coin, self.hold_coin), name, at)
+
+
+	# The coin's strategy weights with indicators of its candles
+	def uses_indicators(self, coin):
+		return any(name in self.indicators.names for name in strategies.get(self.dca_dict[coin]['function']['name']).inputs)
+
+
+	"""
+	Download the candles added since the last wakeup for the coins whose strategies use indicators, all at once
+	The whole history of a coin is downloaded the first time (the drawdown needs the all time high), replays use the stored candles
+	"""
+	async def refresh_candles(self, coins):
+
+		symbols = ['%s/%s' % (coin, self.hold_coin) for coin in coins if self.uses_indicators(coin)]
+		if not symbols or self.clock.virtual:
+			return
+		core, store = self.api.core, self.indicators.store
+		results = await asyncio.gather(*[store.update_async(core.request, core.name, symbol, self.indicators.interval, since=0) for symbol in symbols], return_exceptions=True)
+		for symbol, result in zip(symbols, results):
+			if isinstance(result, Exception):
+				print('Error downloading %s candles for its indicators: %s' % (symbol, result))
+				metrics.inc('errors_total', where='candles')
+
+
 	"""
 	Pull fear and greed index to invest an increasing amount according to it
 	Get the fear and greed index from 0-100 with a mean of approximately 50
 	More fear == Better time to buy so buy more, more greed, worse time to buy so buy less
 	Essentially a way to increase averaging in over dips
 	Based around sentiment, volatility, RSI and other factors
-	Returns a number between 0 and 2 to scale the buy amount buy 
+	The fear_greed strategy turns it into a multiplier between 0 and 2 with one of the strategies.curves
+	Returns the value published on the UTC day of at or the latest one if at is None
+	A past day that isn't published gives None (the buy is weighted 1) rather than today's value
 	"""
-	def fear_greed(self, amount, aggression=1):
+	def fear_greed(self, at=None):
 
-		# Check when it was last pulled
-		now = datetime.now()
-		try:
-			if self.fg_pull is None or (self.fg_pull.date() < now.date() and now.hour >= 0) or (self.fg_pull.date() == now.date() and self.fg_pull.hour == 0 and now.hour > 1):
-				fg_dict = requests.get('https://api.alternative.me/fng/?format=json&date_format=uk').json()		
-				self.fear_greed_value = int(fg_dict['data'][0]['value'])
-				self.fg_pull = datetime.now()
-				print('Pulled Fear and Greed index: %d' % (self.fear_greed_value))
-			
-			fg_weight = -2/(1+np.exp(-0.17*(self.fear_greed_value-50)))+2 # Steep transformation of logistic curve for weighting function
-			print('Investment multiplier: %.4f' % (fg_weight))
+		if at is not None:
+			day = datetime.fromtimestamp(at.timestamp(), timezone.utc)
+			fear_greed_value = self.fg_history.value(day)
+			if fear_greed_value is None:
+				print('No Fear and Greed index for %s' % day.strftime('%Y-%m-%d'))
+			return fear_greed_value
 
-		except Exception as e:
-			fg_weight = 1
-			print('Error: %s' % e)
-		
-		return fg_weight * amount 
+		# Latest value from the stored history, only fetched when a new day is missing
+		fg_date, fear_greed_value = self.fg_history.latest()
+		print('Fear and Greed index: %d (%s)' % (fear_greed_value, fg_date))
+		return fear_greed_value
 
 
 	"""
 	Get DCA report for all coins
 	"""
 	def report(self):
-		pprint({k:v for k,v in self.__dict__.items() if k in self.save_keys})
+		report_dict = {k:v for k,v in self.__dict__.items() if k in self.save_keys}
+		report_dict['wakeup_times'] = self.scheduler.items()
+		pprint(report_dict)
 
 
 	"""
 	Stop
 	"""
 	def stop(self):
-		self.save()
+		self.shutdown()
 		print('Stopped and saved\n\n')
 		exit()
+
+
+	# Save and close the files and the exchange connection
+	def shutdown(self):
+		for gauge, func in self.gauges.items():
+			metrics.remove_gauge(gauge, func, **self.gauge_labels)
+		self.save()
+		self.journal.close()
+		self.state.close()
+		if self.feed is not None:
+			run_sync(self.feed.close())
+		if hasattr(self, 'api'):
+			self.api.close()
 	
 
 	"""
-	Save
+	Save a compacted snapshot, changes are logged as they happen so this only shortens the log to replay
 	"""
 	def save(self):
-		
-		# Create a dictionary of relevant information to save
-		save_dict = {}
-		for key in list(set(self.__dict__.keys()).intersection(self.save_keys)):
-			save_dict[key] = self.__dict__[key]
-
-		# Manage dcas
-		if self.wakeup_times:
-			if 'saved_dca' not in os.listdir():
-				os.mkdir('saved_dca')
-			with open('saved_dca/%s_%s.json' % (datetime.now().strftime('%y_%m_%d-%H_%M_%S'), 'sim' if self.simulate else 'live'), 'w') as json_file:
-				json.dump(save_obj(save_dict), json_file)
+		if len(self.scheduler):
+			self.state.snapshot()
 		else:
 			print('No DCAs running to be saved')
+
+
+	# Fields that aren't plans, trades or wakeups
+	def settings(self):
+		return {k:self.__dict__[k] for k in self.save_keys if k in self.__dict__ and k not in ['previous_buys', 'dca_dict', 'wakeup_times', 'carry']}
+
+
+	# Copy of everything that is saved, made by the state store under trades_lock and written to disk after releasing it
+	# Only the orders still being reconciled are copied, under the reconciler's lock as it fills them in place, the others don't change
+	def state_dict(self):
+		state = copy.deepcopy({k:self.__dict__[k] for k in self.save_keys if k in self.__dict__ and k != 'previous_buys'})
+		with self.api.core.reconciler.lock if hasattr(self, 'api') else contextlib.nullcontext():
+			state['previous_buys'] = {coin:[dict(trade) if trade and trade.get('dca_status') == 'submitted' else trade for trade in trades]
+				for coin, trades in self.previous_buys.items()}
+		state['wakeup_times'] = self.scheduler.items()
+		return state
 	
 
 	"""
 	Resume after stopping
 	"""
-	def resume(self):
+	def resume(self, interactive=True, missed='ask'):
 
-		if 'saved_dca' not in os.listdir():
-			os.mkdir('saved_dca')
-		files = sorted(os.listdir('saved_dca/'))
-		if files:
-			print('\nReloading from last saved file: %s\n' % files[-1])
-			with open('saved_dca/%s' % files[-1], 'r') as json_file:
-				dca = json.load(json_file)
+		dca = self.state.load()
+		if dca is None:
+			print('\nNo saved dca to resume\n')
+			return False
+		print('\nReloading saved dca from the last snapshot and %d logged changes\n' % self.state.since_snapshot)
 		
 		# Read in all the fields from the saved json
 		self.crypto_amounts = dca['crypto_amounts']
 		self.hold_coin = dca['hold_coin']
 		self.previous_buys = dca['previous_buys']
-		if self.simulate != dca['simulate']:
+		self.carry = dca['carry']
+		if self.simulate != dca['simulate'] and interactive:
 			self.simulate = False if input('\n\nSimulate or not? y/n\n\n') == 'n' else True
 		self.dca_dict = dca['dca_dict']
 		self.exchange_name = dca['exchange_name']
-		self.api = self.exchange_apis[self.exchange_name](self.api_keys)
+		if not hasattr(self, 'api'):
+			self.connect(self.exchange_name)
+
+		# Rebuild the running stats, orders that were still being reconciled are counted when they are final
+		for coin in self.previous_buys:
+			self.plan_stats[coin] = PlanStats()
+			for trade in self.previous_buys[coin]:
+				if trade and trade.get('dca_status') == 'submitted':
+					self.api.reconcile(trade, self.trade_logger('%s/%s' % (coin, self.hold_coin)))
+				else:
+					self.plan_stats[coin].add(trade)
 
 		# Convert all the saved time strings into datetimes
-		self.start_time = datetime.strptime(dca['start_time'], '%Y-%m-%dT%H:%M:%S.%f')
-		self.wakeup_times = [[datetime.strptime(i[0],'%Y-%m-%dT%H:%M:%S.%f'), i[1]] for i in dca['wakeup_times']]
+		self.start_time = datetime.fromisoformat(dca['start_time'])
+		wakeup_times = [[datetime.fromisoformat(i[0]), i[1]] for i in dca['wakeup_times']]
 
-		# Loop over the coins in the dca dict and put in the function for the dca multiplier
+		# Strategies are saved by name and parameters, older saves have the short name ('r'/'f') and no parameters
 		for coin in self.dca_dict:
-			self.dca_dict[coin]['function']['func'] = self.strategies[self.dca_dict[coin]['function']['name']]['func']
-
-		# Loop and get the missed buys
-		for i, (wakeup_time, coin) in enumerate(self.wakeup_times):
-			if datetime.now() > wakeup_time:
-				
-				missed = (datetime.now() - wakeup_time).seconds // self.dca_dict[coin]['frequency'] + 1
-				buy_vol = self.dca_dict[coin]['function']['func'](missed * self.dca_dict[coin]['amount'])
-				print('\n\nFor %s %d buys were missed $%.2f (unweighted)' % (coin, missed, buy_vol))
-				buy_skip = input('\n\nBuy missed trades at current price "1" or skip: "2"\n\n')
-				
-				if buy_skip == '1':
-					# TOEDIT # 
-					# Apply the multiplier if any
-					trade = self.buy(coin, buy_vol)
-					self.previous_buys[coin].append(trade)
-				else:
-					print('\n\n-----Skipping missed buys-----\n\n')
-				start_time = datetime.strptime(self.dca_dict[coin]['start_time'], '%Y-%m-%dT%H:%M:%S.%f')
-				self.wakeup_times[i][0] = datetime.now() + timedelta(seconds=self.dca_dict[coin]['frequency'] - (datetime.now() - start_time).total_seconds() % self.dca_dict[coin]['frequency'])
-			else:
-				print('\n\n----No %s buys missed-----\n\n' % coin)
-
-		self.current_prompt = '\nSelect action:\n\nnew dca: "1"\nstats: "2"\nsave: "3"\nstop: "4"\n\n'
-		print(self.current_prompt)
-		self.wakeup_times.sort()
-		self.wakeup_event.set()
+			self.dca_dict[coin]['start_time'] = datetime.fromisoformat(self.dca_dict[coin]['start_time'])
+			function = self.dca_dict[coin]['function']
+			function.pop('func', None)
+			strategy = strategies.get(function['name'])
+			function['name'], function['params'] = strategy.name, strategy.check(function.get('params'))
+
+		# Work out every buy missed while stopped and catch up on them with the chosen policy
+		catch_up = CatchUp(self)
+		missed_plans = catch_up.plan(wakeup_times)
+		if missed_plans:
+			print('\n\n%s\n' % catch_up.summary(missed_plans))
+			if missed == 'ask':
+				missed = {'1':'buy', '2':'book'}.get(input('\n\nBuy missed trades at current price "1", book them as simulated fills at their past prices "2" or skip: "3"\n\n'), 'skip')
+			if missed == 'skip':
+				print('\n\n-----Skipping missed buys-----\n\n')
+			self.record_trades(run_sync(catch_up.run(missed_plans, missed)))
+		elif interactive:
+			print('\n\n----No buys missed-----\n\n')
+
+		# Plans that missed buys wake up at their first slot after now
+		wakeups = [[missed_plans[coin]['next'] if coin in missed_plans else wakeup_time, coin] for wakeup_time, coin in wakeup_times]
+		self.scheduler.schedule_many(wakeups)
+
+		# Compact what was replayed and the changes made while resuming
+		self.state.snapshot()
+
+		if interactive:
+			self.current_prompt = '\nSelect action:\n\nnew dca: "1"\nstats: "2"\nsave: "3"\nstop: "4"\n\n'
+			print(self.current_prompt)
+		self.wake()
+		return True
 		
 
 	"""
@@ -276,36 +580,29 @@ class DCA:
 		stat_str = ''
 		print('\n\n%s DCA Summary %s\n\nNumber of DCAs running: %d\n' % ('-'*20,'-'*20,len(self.previous_buys)))
 
-		# Loop over the previous trades and calculate the average dca buys
+		# The running totals of each plan
 		for coin in self.previous_buys:
 
-			stat_str += coin
-			tot_spent, tot_bought = 0, 0
-			for trade in self.previous_buys[coin]:
-				try:
-					tot_spent += trade['cost']
-					tot_bought += trade['amount']
-				except Exception as e:
-					print('Error: %s' % e)
-
-			if tot_spent > 0:
-				avg_buy = tot_spent / tot_bought 
-
-				strategy_str = ('Strategy', self.strategies[self.dca_dict[coin]['function']['name']]['name'])
-				spent_str = ('Total Spent', '$%.2f' % (tot_spent))
-				bought_str = ('Total Bought', '%.8f %s' % (tot_bought, coin))
-				avg_str = ('Avg Buy Price', '%.8f' % (avg_buy))
+			with self.trades_lock:
+				summary = self.plan_stats[coin].summary()
+
+			if summary['spent'] > 0:
+				strategy_str = ('Strategy', strategies.get(self.dca_dict[coin]['function']['name']).description)
+				spent_str = ('Total Spent', '$%.2f' % (summary['spent']))
+				bought_str = ('Total Bought', '%.8f %s' % (summary['amount'], coin))
+				avg_str = ('Avg Buy Price', '%.8f' % (summary['avg_cost']))
+				count_str = ('Buys', '%d' % summary['count'])
+				fee_strs = [('Fees %s' % currency, '%.8f' % cost) for currency, cost in summary['fees'].items()]
+				window_strs = []
+				for days, window in summary['windows'].items():
+					window_strs.append(('%dD Avg Price' % days, '%.8f' % window['avg_cost'] if window['avg_cost'] else '-'))
+					window_strs.append(('%dD Spend/Day' % days, '$%.2f' % window['spend_rate']))
 
-				
-				stat_str += '  %s\n\n' % ('*' * 35)
 				stat_str =  '\n  %s\n                  %s               ' % ('*'*35, coin)
-				stat_str += '\n  * %s:%s *' % (strategy_str[0], (' '*(30 - len(strategy_str[0]) - len(strategy_str[1]))) + strategy_str[1])
-				stat_str += '\n  * %s:%s *' % (spent_str[0], (' '*(30 - len(spent_str[0]) - len(spent_str[1]))) + spent_str[1])
-				stat_str += '\n  * %s:%s *' % (bought_str[0], (' '*(30 - len(bought_str[0]) - len(bought_str[1]))) + bought_str[1])
-				stat_str += '\n  * %s:%s *' % (avg_str[0], (' '*(30 - len(avg_str[0]) - len(avg_str[1]))) + avg_str[1])
+				for name, value in [strategy_str, spent_str, bought_str, avg_str, count_str] + fee_strs + window_strs:
+					stat_str += '\n  * %s:%s *' % (name, (' '*(30 - len(name) - len(value))) + value)
 				stat_str += '\n  %s\n\n' % ('*' * 35)
 
-				#print('\n%s Total Spent: $%.2f\nTotal Bought %.8f %s\nAvg Buy Price: %.8f' % (coin, tot_spent, tot_bought, coin, avg_buy))
 				print(stat_str)
 
 			else:
@@ -313,13 +610,10 @@ class DCA:
 
 
 	"""
-	Log the trade in a json
+	Log the trade in the trade journal
 	"""
 	def save_trade(self, trade, ticker):
-		if 'prev_trades' not in os.listdir():
-			os.mkdir('prev_trades')
-		with open('prev_trades/dca_%s_%s_%s.json' % (datetime.now().strftime('%y_%m_%d-%H_%M_%S'), ticker.split('/')[0], 'sim' if self.simulate else 'live'), 'w') as write_file:
-			json.dump(trade, write_file)
+		self.journal.append(trade, ticker.split('/')[0], 'sim' if self.simulate else 'live')
 
 
 	"""
@@ -331,7 +625,7 @@ class DCA:
 			coin = input(self.current_prompt).upper()
 			if not coin:
 				coin = 'BTC'
-			if coin+'/'+self.hold_coin not in self.api.markets:
+			if coin+'/'+self.hold_coin not in self.api.market_cache:
 				print('\n\n%s not found in %s tickers' % (coin+'/'+self.hold_coin, self.exchange_name))
 			else:
 				break
@@ -351,86 +645,67 @@ class DCA:
 		# Get the frequency of the purchases
 		self.current_prompt = '\nInsert frequency to buy in Seconds/Minutes/Hours/Days/Weeks S/M/H/D/W\n\ne.g. 20S/12H/3D/1W\n\n'
 		while 1:
-			freq_str = input(self.current_prompt)
+			# Convert the user input in to a number of seconds to sleep for
+			freq_str = input(self.current_prompt) or '10S'
 			try:
-				if not freq_str:
-					frequency = 10
-					frequency_scale = 's'
-					break
-				elif freq_str[:-1].isnumeric() and freq_str[-1].lower() in ['s','m','h','d','w']:
-					frequency = float(freq_str[:-1])
-					frequency_scale = freq_str[-1]
-					break
-				else:
-					print('\nIncorrect format\n')
+				frequency = parse_frequency(freq_str)
+				break
 			except Exception as e:
 				print('\nIncorrect format\n')
-				
-		# Convert the user input in to a number of seconds to sleep for 
-		if frequency_scale.lower() == 'w':
-			frequency *= 3600 * 24 * 7
-		elif frequency_scale.lower() == 'd':
-			frequency *= 3600 * 24
-		elif frequency_scale.lower() == 'h':
-			frequency *= 3600
-		elif frequency_scale.lower() == 'm':
-			frequency *= 60
 
 		# Choose a starting time for the dca
 		self.current_prompt = '\nTime to start the buy (00:01 UTC recommended for fear and greed)\nPut in your local time in 24H format e.g. 19:00 or leave blank for start now\n\n'
 		while 1:
-			start_time = input(self.current_prompt)
-			if start_time:
-				try:
-					hours,minutes = start_time.split(':')
-					start_time = datetime.now().replace(hour=int(hours), minute=int(minutes), second=0)
-					if start_time < datetime.now():
-						start_time += timedelta(days=1)
-					break
-				except Exception as e:
-					print('\nIncorrect format\n')
-					
-			else:
-				start_time = datetime.now()
+			try:
+				start_time = parse_start_time(input(self.current_prompt))
 				break
+			except Exception as e:
+				print('\nIncorrect format\n')
 		print('Starting buys on: %s' % (start_time.strftime('%b %d - %H:%M:%S')))
 
 		# Choose which strategy
-		self.current_prompt = '\nStrategy: Regular/Fear & Greed r/f\n\n'
+		self.current_prompt = '\nStrategy: Regular/Fear & Greed r/f (or one of %s)\n\n' % ', '.join(strategies.registry)
 		strategy = input(self.current_prompt)
-		if strategy == 'f':
-			strategy = 'f'
-		else:
+		if strategy not in strategies.registry and strategy not in strategies.aliases:
 			strategy = 'r'
-		
+
+		params = {}
+		if strategies.get(strategy).name == 'fear_greed':
+			self.current_prompt = '\nAggression, 1 for the standard weighting, higher buys more in fear and less in greed (blank for 1)\n\n'
+			try:
+				params['aggression'] = float(input(self.current_prompt) or 1)
+			except ValueError:
+				print('\nIncorrect format, using 1\n')
+				params['aggression'] = 1
+
 		# Start the dca
-		self.add_dca(coin, amount, frequency, start_time, strategy, freq_str)
+		self.add_dca(coin, amount, frequency, start_time, strategy, freq_str, params)
 
 
 	"""
 	Thread asking user for their inputs to interact with the system
 	"""
 	def input_thread(self):
-		t = threading.Thread(target=self.manage_dcas)
-		t.setDaemon(True)
-		t.start()
+		spawn(self.manage_dcas())
+		# ccxt takes the longest to import so it loads while the first prompts wait for the user
+		preload('apis.async_core')
 
 		resume = 'n'
-		if 'saved_dca' not in os.listdir():
-			os.mkdir('saved_dca')
-		if len(os.listdir('saved_dca')):
-			self.current_prompt = '\nResume saved dca from: %s ? y/n\n\n' % (datetime.strptime(sorted(os.listdir('saved_dca/'))[-1][:17], '%y_%m_%d-%H_%M_%S').strftime('%b %d %H:%M:%S'))
+		saved_time = self.state.saved_time()
+		if saved_time is not None:
+			self.current_prompt = '\nResume saved dca from: %s ? y/n\n\n' % (saved_time.strftime('%b %d %H:%M:%S'))
 			resume = input(self.current_prompt)
 			
 
 		if resume != 'y':
+			self.state.reset()
 			while 1:
 				self.current_prompt = '\nChoose exchange: binance/ftx/kraken/kucoin/mexc: b/f/kr/ku/m\n\n'
 				exchange = input(self.current_prompt)
 				try:
 					if not exchange:
 						exchange = 'b'
-					self.api = self.exchange_dict[exchange.lower()]['api'](self.api_keys)
+					self.connect(self.exchange_dict[exchange.lower()]['name'])
 					self.hold_coin = self.exchange_dict[exchange.lower()]['hold']
 					self.exchange_name = self.exchange_dict[exchange.lower()]['name']
 					break
@@ -486,19 +761,110 @@ class DCA:
 			print('\nHandling keyboard interrupt')
 			self.stop()
 
+"""
+Run the dcas in a config file without any prompts, one DCA per exchange with its state in saved_dca/<exchange>
+{"simulate": true, "log": false, "resume": true, "missed": "skip" (or "buy"/"book", see CatchUp),
+ "prices": "poll" (or a replay file for simulating), "record_prices": file to record the polled quotes to,
+ "exchanges": {"binance": {"hold": "USDT", "plans": [{"coin": "BTC", "amount": 10, "frequency": "1D", "start": "00:01", "strategy": "f"}]}}}
+Every plan is checked against the cached markets before anything starts, the run stops on SIGTERM or Ctrl-C after saving
+"""
+def run_config(config_path):
+
+	with open(config_path, 'r') as json_file:
+		config = json.load(json_file)
+	simulate, log = config.get('simulate', True), config.get('log', False)
+	journal = TradeJournal()
+
+	# Set up every exchange and check all the plans in one pass
+	dcas, plans, errors = {}, {}, []
+	for exchange_name, exchange_config in config['exchanges'].items():
+		if exchange_name not in exchanges:
+			errors.append('Unknown exchange %s' % exchange_name)
+			continue
+		# The price feed settings can be given for all the exchanges or per exchange
+		price_feed = exchange_config.get('prices', config.get('prices', 'poll'))
+		if simulate and price_feed != 'poll' and not os.path.exists(price_feed):
+			errors.append('%s replay file %s not found' % (exchange_name, price_feed))
+		dca = DCA('%s_%s' % (config.get('name', 'dca'), exchange_name), simulate=simulate, log=log, state_root=os.path.join('saved_dca', exchange_name), journal=journal,
+			price_feed=price_feed, record_prices=exchange_config.get('record_prices', config.get('record_prices')))
+		dca.exchange_name = exchange_name
+		dca.hold_coin = exchange_config.get('hold', exchanges[exchange_name]['hold'])
+		dca.connect(exchange_name)
+		dcas[exchange_name] = dca
+
+		plans[exchange_name] = []
+		for i, plan in enumerate(exchange_config.get('plans', [])):
+			try:
+				coin = plan['coin'].upper()
+				if '%s/%s' % (coin, dca.hold_coin) not in dca.api.market_cache:
+					raise ValueError('%s/%s not found in %s markets' % (coin, dca.hold_coin, exchange_name))
+				strategies.get(plan.get('strategy', 'r')).check(plan.get('params'))
+				plans[exchange_name].append({'coin':coin, 'amount':float(plan['amount']), 'frequency':parse_frequency(plan.get('frequency', '1D')),
+					'start_time':parse_start_time(plan.get('start', '')), 'strategy':plan.get('strategy', 'r'), 'params':plan.get('params')})
+			except Exception as e:
+				errors.append('%s plan %d: %s' % (exchange_name, i, e))
+
+	if config.get('missed', 'skip') not in CatchUp.policies:
+		errors.append('Unknown missed buys policy %s, use one of %s' % (config['missed'], '/'.join(CatchUp.policies)))
+
+	if errors:
+		print('Errors in %s:\n%s' % (config_path, '\n'.join(errors)))
+		for dca in dcas.values():
+			dca.api.close()
+		sys.exit(1)
+
+	# Resume what was saved and add the plans that aren't running yet
+	for exchange_name, dca in dcas.items():
+		spawn(dca.manage_dcas())
+		if config.get('resume', True) and dca.state.saved_time() is not None:
+			dca.resume(interactive=False, missed=config.get('missed', 'skip'))
+		else:
+			dca.state.reset()
+		added = dca.add_dcas(plans[exchange_name])
+		print('%s: %d dcas running, %d added from %s' % (exchange_name, len(dca.dca_dict), added, config_path))
+
+	signal.signal(signal.SIGTERM, lambda signum, frame : sys.exit(0))
+	try:
+		while 1:
+			time.sleep(3600)
+	except (KeyboardInterrupt, SystemExit):
+		print('\nStopping')
+	finally:
+		for dca in dcas.values():
+			dca.shutdown()
+		print('Stopped and saved\n\n')
+
+
 if __name__ == '__main__':
+	# -m <port> serves the metrics, -p <file> profiles the run and writes the stats to the file on exit
+	if '-m' in sys.argv:
+		metrics.serve(int(sys.argv[sys.argv.index('-m') + 1]))
+	if '-p' in sys.argv:
+		metrics.start_profile()
+		atexit.register(metrics.stop_profile, sys.argv[sys.argv.index('-p') + 1])
+
+	if '-c' in sys.argv:
+		run_config(sys.argv[sys.argv.index('-c') + 1])
+		sys.exit()
+
 	log, simulate = False, False
 	if '-l' in sys.argv:
 		log = True
 		print('\n\nLogging Buy Orders')
+	# -f <file> simulates with the quotes replayed from a file, -r <file> records the quotes polled while simulating
+	price_feed, record_prices = None, None
 	if '-s' in sys.argv:
 		simulate = True
-		print('\n\nSIMULATING')
+		if '-f' in sys.argv:
+			price_feed = sys.argv[sys.argv.index('-f') + 1]
+		if '-r' in sys.argv:
+			record_prices = sys.argv[sys.argv.index('-r') + 1]
+		print('\n\nSIMULATING%s' % (' with quotes from %s' % price_feed if price_feed else ''))
 	else:
 		print('\n\nLIVE TRADING')
 
 
-	dca = DCA('dca_test', simulate=simulate, log=log)
+	dca = DCA('dca_test', simulate=simulate, log=log, price_feed=price_feed, record_prices=record_prices)
 	dca.input_thread()
 
 
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+
+from candle_store import CandleStore
+from apis.event_loop import run_sync
+from apis.registry import exchanges, load_api, public_keys
+
+
+"""
+Download the candles of many (symbol, interval) pairs at once into a CandleStore
+Every pair pages through its history with CandleStore.update_async, the pages go straight into the store and the
+adapter's rate limiter paces the requests of all the pairs, concurrency is how many pairs page at the same time
+A pair that fails is retried with backoff from its last stored candle, after retries it is marked failed and the others carry on
+The checkpoint (json) holds the plan and the status of every pair so resume() finishes an interrupted download,
+within a pair the store itself is the checkpoint as each page is committed when it's appended
+"""
+class Downloader:
+
+	def __init__(self, store, core, concurrency=8, retries=4, backoff=2, checkpoint=None, quiet=False):
+		self.store = store
+		self.core = core
+		self.concurrency = concurrency
+		self.retries = retries
+		self.backoff = backoff
+		self.checkpoint = checkpoint
+		self.quiet = quiet
+		self.plan = None
+		self.lock = threading.Lock()
+
+
+	@staticmethod
+	def key(symbol, interval):
+		return '%s %s' % (symbol, interval)
+
+
+	def save(self):
+		if not self.checkpoint:
+			return
+		with self.lock:
+			os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint)), exist_ok=True)
+			with open(self.checkpoint + '.tmp', 'w') as json_file:
+				json.dump(self.plan, json_file, indent=1)
+			os.replace(self.checkpoint + '.tmp', self.checkpoint)
+
+
+	"""
+	Download every (symbol, interval) pair from since (ms, 0 for the whole history) up to until (ms, None for now)
+	Returns {(symbol, interval): candles added or the exception it failed with}
+	"""
+	async def run(self, pairs, since=0, until=None, limit=None):
+
+		jobs = {self.key(symbol, interval):{'symbol':symbol, 'interval':interval, 'status':'pending', 'added':0, 'error':None} for symbol, interval in pairs}
+		self.plan = {'exchange':self.core.name, 'since':since, 'until':until, 'limit':limit, 'jobs':jobs}
+		return await self.start()
+
+
+	"""
+	Carry on with the pairs of the checkpoint that didn't finish, returns the results of those pairs like run
+	"""
+	async def resume(self):
+
+		with open(self.checkpoint, 'r') as json_file:
+			self.plan = json.load(json_file)
+		if self.plan['exchange'] != self.core.name:
+			raise ValueError('Checkpoint %s is a download from %s, not %s' % (self.checkpoint, self.plan['exchange'], self.core.name))
+		return await self.start()
+
+
+	async def start(self):
+
+		pending = [job for job in self.plan['jobs'].values() if job['status'] != 'done']
+		slots = asyncio.Semaphore(self.concurrency)
+		self.done, self.total, self.t0 = len(self.plan['jobs']) - len(pending), len(self.plan['jobs']), time.time()
+		await asyncio.to_thread(self.save)
+
+		async def fetch(job):
+			async with slots:
+				return await self.fetch(job)
+		results = await asyncio.gather(*[fetch(job) for job in pending])
+		return {(job['symbol'], job['interval']):result for job, result in zip(pending, results)}
+
+
+	# Page through one pair, retrying from the last stored candle when a request fails
+	async def fetch(self, job):
+
+		job['status'] = 'running'
+		for attempt in range(self.retries + 1):
+			try:
+				added = await self.store.update_async(self.core.request, self.core.name, job['symbol'], job['interval'],
+					since=self.plan['since'], until=self.plan['until'], limit=self.plan['limit'])
+				job['added'] += added
+				job['status'], job['error'] = 'done', None
+				break
+			except Exception as e:
+				job['error'] = '%s: %s' % (type(e).__name__, e)
+				if attempt == self.retries:
+					job['status'] = 'failed'
+					added = e
+					break
+				await asyncio.sleep(self.backoff * 2**attempt)
+
+		self.done += 1
+		await asyncio.to_thread(self.save)
+		if not self.quiet:
+			print('%s %s: %s (%d/%d, %.1fs)' % (job['symbol'], job['interval'], job['error'] or '%d candles' % job['added'], self.done, self.total, time.time() - self.t0))
+		return added
+
+
+# Default checkpoint of an exchange's downloads in a store
+def checkpoint_path(store, exchange_name):
+	return os.path.join(store.root, exchange_name, 'download.json')
+
+
+"""
+Download the pairs from an exchange's public endpoints without keys, blocking until they are all done
+The progress is checkpointed in the store so download(..., resume=True) finishes an interrupted download
+	download('binance', [('BTC/USDT', '1d'), ('ETH/USDT', '1d'), ('BTC/USDT', '1h')], since=0)
+"""
+def download(exchange_name, pairs=(), since=0, until=None, store=None, concurrency=8, resume=False, quiet=False):
+
+	store = store or CandleStore()
+	api = load_api(exchange_name)(public_keys(exchange_name))
+	downloader = Downloader(store, api.core, concurrency, checkpoint=checkpoint_path(store, exchange_name), quiet=quiet)
+	try:
+		if resume:
+			return run_sync(downloader.resume())
+		return run_sync(downloader.run(pairs, since, until, exchanges[exchange_name]['ohlcv_limit']))
+	finally:
+		api.close()
+
+
+"""
+Download the candles of many symbols and intervals into the candle store
+	python downloader.py binance BTC/USDT ETH/USDT SOL/USDT -i 1d 1h --since 2019-01-01
+	python downloader.py binance --resume
+"""
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Download historical candles of many symbols at once')
+	parser.add_argument('exchange', choices=list(exchanges))
+	parser.add_argument('symbols', nargs='*')
+	parser.add_argument('-i', '--intervals', nargs='+', default=['1d'])
+	parser.add_argument('--since', type=datetime.fromisoformat, help='start date, the whole history if not given')
+	parser.add_argument('--until', type=datetime.fromisoformat, help='end date, up to now if not given')
+	parser.add_argument('--concurrency', type=int, default=8, help='symbols downloading at the same time')
+	parser.add_argument('--root', default='candles', help='candle store directory')
+	parser.add_argument('--resume', action='store_true', help='finish the last download of the exchange')
+	args = parser.parse_args()
+
+	store = CandleStore(args.root)
+	if not args.resume and not args.symbols:
+		parser.error('give the symbols to download or --resume')
+	if args.resume and not os.path.exists(checkpoint_path(store, args.exchange)):
+		parser.error('no download of %s to resume in %s' % (args.exchange, args.root))
+
+	pairs = [(symbol.upper(), interval) for symbol in args.symbols for interval in args.intervals]
+	since = int(args.since.timestamp() * 1000) if args.since else 0
+	until = int(args.until.timestamp() * 1000) if args.until else None
+	results = download(args.exchange, pairs, since, until, store, args.concurrency, args.resume)
+
+	failed = [pair for pair, result in results.items() if isinstance(result, Exception)]
+	print('\n%d candles added, %d of %d downloads failed%s' % (sum(r for r in results.values() if not isinstance(r, Exception)), len(failed), len(results),
+		' (run with --resume to retry them)' if failed else ''))
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+
+"""
+Disk backed daily history of the crypto fear and greed index (https://alternative.me/crypto/fear-and-greed-index)
+Shared by the live bot and the backtest, only the days missing since the last stored value are downloaded
+The index is published once a day at 00:00 UTC
+"""
+class FearGreedHistory:
+
+	endpoint = 'https://api.alternative.me/fng/'
+
+	def __init__(self, path='cache/fear_greed.json', ttl=600):
+		self.path = path
+		self.ttl = ttl
+		self.values = {} # {'2021-09-13': 31, ...} UTC dates
+		self.checked = 0
+		self.lock = threading.Lock()
+		self.fetching = None
+		self.load()
+
+
+	"""
+	Read the stored history
+	"""
+	def load(self):
+		try:
+			with open(self.path, 'r') as json_file:
+				self.values = json.load(json_file)
+		except (FileNotFoundError, ValueError):
+			self.values = {}
+
+
+	"""
+	Write the history to a temporary file and rename it over the old one
+	"""
+	def save(self):
+		if os.path.dirname(self.path):
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		with open(self.path + '.tmp', 'w') as json_file:
+			json.dump(self.values, json_file, sort_keys=True)
+		os.replace(self.path + '.tmp', self.path)
+
+
+	"""
+	Today's value hasn't been stored and the last attempt to fetch it was more than ttl seconds ago
+	"""
+	def stale(self):
+		today = datetime.now(timezone.utc).date().isoformat()
+		return today not in self.values and time.time() - self.checked > self.ttl
+
+
+	"""
+	Download the days missing from the history, concurrent callers wait for the one fetch in flight
+	"""
+	def refresh(self, force=False, timeout=30):
+
+		with self.lock:
+			fetching = self.fetching
+			if fetching is None:
+				if not force and not self.stale():
+					return
+				self.fetching = threading.Event()
+
+		if fetching is not None:
+			fetching.wait(timeout)
+			return
+
+		try:
+			# limit=0 returns the whole history
+			limit = 0
+			if self.values:
+				last = datetime.strptime(max(self.values), '%Y-%m-%d').date()
+				limit = (datetime.now(timezone.utc).date() - last).days + 1
+
+			import requests
+			fg_dict = requests.get(self.endpoint, params={'limit':limit, 'format':'json'}, timeout=timeout).json()
+			values = dict(self.values)
+			for day in fg_dict['data']:
+				date = datetime.fromtimestamp(int(day['timestamp']), timezone.utc).date().isoformat()
+				values[date] = int(day['value'])
+
+			with self.lock:
+				self.values = values
+			self.save()
+			print('Pulled Fear and Greed index: %d days up to %s' % (len(fg_dict['data']), max(values)))
+
+		finally:
+			with self.lock:
+				self.checked = time.time()
+				self.fetching.set()
+				self.fetching = None
+
+
+	"""
+	Most recent (date, value) in the history, refreshing it first if it is stale
+	"""
+	def latest(self):
+		self.refresh()
+		values = self.values
+		if not values:
+			raise ValueError('No fear and greed values stored')
+		day = max(values)
+		return day, values[day]
+
+
+	"""
+	Value for a date (datetime, date or 'YYYY-MM-DD'), None if it is not in the history
+	"""
+	def value(self, day):
+		if not isinstance(day, str):
+			day = day.strftime('%Y-%m-%d')
+		return self.values.get(day)
+
+
+	"""
+	DataFrame of the history with a fear_greed column indexed by date for the backtest
+	"""
+	def frame(self):
+		import pandas as pd
+		values = self.values
+		df = pd.DataFrame({'fear_greed':list(values.values())}, index=pd.to_datetime(list(values.keys())))
+		return df.sort_index()
@@ -0,0 +1,251 @@
+import os
+import json
+import math
+import threading
+from collections import deque
+from lazy import lazy_module
+from candle_store import CandleStore, interval_ms
+
+np = lazy_module('numpy')
+
+
+# Every double is a whole multiple of 2**-1074 so sums scaled by 2**1074 are exact integers
+_scale = 2**1074
+
+
+def _exact(x):
+	numerator, denominator = x.as_integer_ratio()
+	return numerator * (_scale // denominator)
+
+
+"""
+Streaming indicators of one symbol's candles, every candle updates the state in constant time
+	rsi          Wilder's RSI, seeded with the simple average of the first rsi_period changes
+	volatility   EWMA (RiskMetrics) volatility of the log returns per candle, seeded with the first squared return
+	sma_<n>      simple moving averages, the window is summed exactly so the value doesn't drift with rounding
+	ema_<n>      exponential moving averages seeded with the first close
+	drawdown     close over the highest high so far minus 1 (0 at the all time high, -0.5 half way down)
+The arithmetic is done in the same order as batch() so both give the same values to the bit
+"""
+class IndicatorState:
+
+	def __init__(self, rsi_period=14, ewma_lambda=0.94, ma_periods=(20, 50, 200)):
+		self.rsi_period = rsi_period
+		self.ewma_lambda = ewma_lambda
+		self.ma_periods = tuple(ma_periods)
+		self.last = None # Timestamp (ms) of the last candle
+		self.close = None
+		self.count = 0
+		self.gain_sum = 0.0
+		self.loss_sum = 0.0
+		self.avg_gain = None
+		self.avg_loss = None
+		self.var = None
+		self.windows = {p:deque() for p in self.ma_periods}
+		self.sums = {p:0 for p in self.ma_periods}
+		self.emas = {p:None for p in self.ma_periods}
+		self.ath = None
+
+
+	"""
+	Add the next candle
+	"""
+	def update(self, timestamp, high, close):
+
+		n = self.rsi_period
+		if self.close is not None:
+			change = close - self.close
+			gain, loss = max(change, 0.0), max(-change, 0.0)
+			if self.avg_gain is None:
+				self.gain_sum += gain
+				self.loss_sum += loss
+				if self.count == n:
+					self.avg_gain, self.avg_loss = self.gain_sum / n, self.loss_sum / n
+			else:
+				self.avg_gain = (self.avg_gain * (n - 1) + gain) / n
+				self.avg_loss = (self.avg_loss * (n - 1) + loss) / n
+
+			log_return = math.log(close / self.close)
+			squared = log_return * log_return
+			self.var = squared if self.var is None else self.ewma_lambda * self.var + (1 - self.ewma_lambda) * squared
+
+		for p in self.ma_periods:
+			window = self.windows[p]
+			window.append(close)
+			self.sums[p] += _exact(close)
+			if len(window) > p:
+				self.sums[p] -= _exact(window.popleft())
+			alpha = 2 / (p + 1)
+			self.emas[p] = close if self.emas[p] is None else (1 - alpha) * self.emas[p] + alpha * close
+
+		self.ath = high if self.ath is None else max(self.ath, high)
+		self.close = close
+		self.last = timestamp
+		self.count += 1
+
+
+	"""
+	The indicators after the last candle, nan until there are enough candles
+	"""
+	def values(self):
+
+		values = {'close':self.close if self.close is not None else math.nan}
+		if self.avg_gain is None:
+			values['rsi'] = math.nan
+		else:
+			values['rsi'] = 100.0 if self.avg_loss == 0 else 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+		values['volatility'] = math.sqrt(self.var) if self.var is not None else math.nan
+		for p in self.ma_periods:
+			values['sma_%d' % p] = self.sums[p] / _scale / p if len(self.windows[p]) == p else math.nan
+			values['ema_%d' % p] = self.emas[p] if self.emas[p] is not None else math.nan
+		values['drawdown'] = self.close / self.ath - 1 if self.ath else math.nan
+		return values
+
+
+	def to_dict(self):
+		return {'rsi_period':self.rsi_period, 'ewma_lambda':self.ewma_lambda, 'ma_periods':self.ma_periods, 'last':self.last, 'close':self.close,
+			'count':self.count, 'gain_sum':self.gain_sum, 'loss_sum':self.loss_sum, 'avg_gain':self.avg_gain, 'avg_loss':self.avg_loss, 'var':self.var,
+			'windows':{str(p):list(w) for p, w in self.windows.items()}, 'emas':{str(p):e for p, e in self.emas.items()}, 'ath':self.ath}
+
+
+	@classmethod
+	def from_dict(cls, data):
+		state = cls(data['rsi_period'], data['ewma_lambda'], data['ma_periods'])
+		for key in ['last', 'close', 'count', 'gain_sum', 'loss_sum', 'avg_gain', 'avg_loss', 'var', 'ath']:
+			setattr(state, key, data[key])
+		state.windows = {p:deque(data['windows'][str(p)]) for p in state.ma_periods}
+		state.sums = {p:sum(_exact(x) for x in state.windows[p]) for p in state.ma_periods}
+		state.emas = {p:data['emas'][str(p)] for p in state.ma_periods}
+		return state
+
+
+"""
+Every indicator of IndicatorState for every candle recomputed from scratch, {name: array}
+The recursive indicators (RSI, volatility, EMAs) are loops over the candles, the others are computed per window or with NumPy
+"""
+def batch(highs, closes, rsi_period=14, ewma_lambda=0.94, ma_periods=(20, 50, 200)):
+
+	highs, closes = np.asarray(highs, dtype=float), np.asarray(closes, dtype=float)
+	count, n, lam = len(closes), rsi_period, ewma_lambda
+	values = {'close':closes.copy(), 'rsi':np.full(count, math.nan), 'volatility':np.full(count, math.nan)}
+
+	gain_sum = loss_sum = 0.0
+	avg_gain = avg_loss = var = None
+	for i in range(1, count):
+		change = float(closes[i]) - float(closes[i-1])
+		gain, loss = max(change, 0.0), max(-change, 0.0)
+		if avg_gain is None:
+			gain_sum += gain
+			loss_sum += loss
+			if i == n:
+				avg_gain, avg_loss = gain_sum / n, loss_sum / n
+		else:
+			avg_gain = (avg_gain * (n - 1) + gain) / n
+			avg_loss = (avg_loss * (n - 1) + loss) / n
+		if avg_gain is not None:
+			values['rsi'][i] = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+
+		log_return = math.log(float(closes[i]) / float(closes[i-1]))
+		var = log_return * log_return if var is None else lam * var + (1 - lam) * (log_return * log_return)
+		values['volatility'][i] = math.sqrt(var)
+
+	closes_list = closes.tolist()
+	for p in ma_periods:
+		sma = np.full(count, math.nan)
+		for i in range(p - 1, count):
+			sma[i] = math.fsum(closes_list[i-p+1:i+1]) / p
+		values['sma_%d' % p] = sma
+
+		ema = np.empty(count)
+		alpha = 2 / (p + 1)
+		for i, close in enumerate(closes_list):
+			ema[i] = close if i == 0 else (1 - alpha) * ema[i-1] + alpha * close
+		values['ema_%d' % p] = ema
+
+	values['drawdown'] = closes / np.maximum.accumulate(highs) - 1 if count else np.empty(0)
+	return values
+
+
+"""
+Indicators of the symbols in a CandleStore kept up to date from the candles added since the last update
+The state of each symbol is saved as json in root so only new candles are read after a restart
+"""
+class IndicatorEngine:
+
+	names = ['close', 'rsi', 'volatility', 'drawdown']
+
+	def __init__(self, store=None, root='cache/indicators', interval='1d', rsi_period=14, ewma_lambda=0.94, ma_periods=(20, 50, 200)):
+		self.store = store or CandleStore()
+		self.root = root
+		self.interval = interval
+		self.settings = {'rsi_period':rsi_period, 'ewma_lambda':ewma_lambda, 'ma_periods':tuple(ma_periods)}
+		self.names = self.names + ['%s_%d' % (kind, p) for p in ma_periods for kind in ['sma', 'ema']]
+		self.states = {}
+		self.lock = threading.RLock()
+
+
+	def path(self, exchange, symbol):
+		return os.path.join(self.root, exchange, '%s_%s.json' % (symbol.replace('/', '_'), self.interval))
+
+
+	# Saved state of a symbol or a new one (also when the settings changed)
+	def state(self, exchange, symbol):
+
+		key = (exchange, symbol)
+		if key not in self.states:
+			state = None
+			try:
+				with open(self.path(exchange, symbol), 'r') as json_file:
+					state = IndicatorState.from_dict(json.load(json_file))
+				if (state.rsi_period, state.ewma_lambda, state.ma_periods) != tuple(self.settings.values()):
+					state = None
+			except (FileNotFoundError, ValueError, KeyError):
+				pass
+			self.states[key] = state or IndicatorState(**self.settings)
+		return self.states[key]
+
+
+	def save(self, exchange, symbol, state):
+		path = self.path(exchange, symbol)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path + '.tmp', 'w') as json_file:
+			json.dump(state.to_dict(), json_file)
+		os.replace(path + '.tmp', path)
+
+
+	"""
+	Feed the stored candles newer than the state (up to until, ms) and save it, returns the indicator values
+	"""
+	def update(self, exchange, symbol, until=None):
+
+		with self.lock:
+			state = self.state(exchange, symbol)
+			candles = self.store.load(exchange, symbol, self.interval, since=None if state.last is None else state.last + 1, until=until)
+			if len(candles['timestamp']):
+				for timestamp, high, close in zip(candles['timestamp'].tolist(), candles['high'].tolist(), candles['close'].tolist()):
+					state.update(timestamp, high, close)
+				self.save(exchange, symbol, state)
+			return state.values()
+
+
+	def update_many(self, exchange, symbols):
+		return {symbol:self.update(exchange, symbol) for symbol in symbols}
+
+
+	"""
+	Value of an indicator of a symbol from the candles complete by at (a datetime, None for all the stored candles)
+	States ahead of at (catching up on old buys) are left alone and the value is recomputed from the candles up to at
+	"""
+	def value(self, exchange, symbol, name, at=None):
+
+		if at is None:
+			return self.update(exchange, symbol)[name]
+		until = int(at.timestamp() * 1000) - interval_ms(self.interval)
+		with self.lock:
+			state = self.state(exchange, symbol)
+			if state.last is None or state.last <= until:
+				return self.update(exchange, symbol, until)[name]
+		candles = self.store.load(exchange, symbol, self.interval, until=until)
+		if not len(candles['timestamp']):
+			return math.nan
+		return float(batch(candles['high'], candles['close'], **self.settings)[name][-1])
@@ -0,0 +1,43 @@
+import importlib
+import threading
+
+
+"""
+Module imported the first time one of its attributes is used, for the heavy libraries the bot only needs once it buys
+	np = lazy_module('numpy')
+Attributes are kept on the proxy after the first lookup so later uses cost the same as the real module's
+"""
+class lazy_module:
+
+	def __init__(self, name):
+		self._name = name
+		self._module = None
+
+
+	def __getattr__(self, attr):
+		if self._module is None:
+			self._module = importlib.import_module(self._name)
+		value = getattr(self._module, attr)
+		setattr(self, attr, value)
+		return value
+
+
+	def __repr__(self):
+		return '<lazy module %s%s>' % (self._name, '' if self._module is None else ' (imported)')
+
+
+"""
+Import modules on a daemon thread so they are ready by the time they are needed (while the user reads a prompt)
+The import lock makes a later import in another thread wait for this one instead of importing twice
+"""
+def preload(*names):
+
+	def load():
+		for name in names:
+			try:
+				importlib.import_module(name)
+			except Exception:
+				pass
+	thread = threading.Thread(target=load, daemon=True)
+	thread.start()
+	return thread
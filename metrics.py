@@ -0,0 +1,206 @@
+import time
+import threading
+import contextlib
+
+
+"""
+In process metrics (counters, gauges and latency histograms) rendered in the Prometheus text format
+Recording does nothing until the metrics are enabled (serve() enables them) so the instrumented code pays
+one attribute check when they are off
+"""
+class Metrics:
+
+	buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+	def __init__(self):
+		self.enabled = False
+		self.lock = threading.Lock()
+		self.counters = {} # {(name, labels): value}
+		self.gauges = {}
+		self.gauge_funcs = {} # {(name, labels): function returning the value when rendered}
+		self.histograms = {} # {(name, labels): [bucket counts..., sum, count]}
+		self.profiles = None
+		self.server = None
+
+
+	def inc(self, name, value=1, **labels):
+		if not self.enabled:
+			return
+		key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+
+	def set(self, name, value, **labels):
+		if not self.enabled:
+			return
+		with self.lock:
+			self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+	"""
+	Gauge read when the metrics are rendered, e.g. the length of a queue
+	"""
+	def gauge(self, name, func, **labels):
+		with self.lock:
+			self.gauge_funcs[(name, tuple(sorted(labels.items())))] = func
+
+
+	"""
+	Stop reading a gauge, only when it is still func if given (another owner with the same labels may have replaced it)
+	"""
+	def remove_gauge(self, name, func=None, **labels):
+		key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			if func is None or self.gauge_funcs.get(key) is func:
+				self.gauge_funcs.pop(key, None)
+
+
+	def observe(self, name, value, **labels):
+		if not self.enabled:
+			return
+		key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = [0] * (len(self.buckets) + 2)
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					histogram[i] += 1
+					break
+			histogram[-2] += value
+			histogram[-1] += 1
+
+
+	"""
+	Context manager observing how long its block took in seconds
+	"""
+	def timer(self, name, **labels):
+		if not self.enabled:
+			return null_timer
+		return self._timer(name, labels)
+
+
+	@contextlib.contextmanager
+	def _timer(self, name, labels):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name, time.perf_counter() - start, **labels)
+
+
+	"""
+	All the metrics in the Prometheus text exposition format
+	"""
+	def render(self):
+
+		with self.lock:
+			counters, gauges, histograms = dict(self.counters), dict(self.gauges), {k:list(v) for k, v in self.histograms.items()}
+			gauge_funcs = dict(self.gauge_funcs)
+		for key, func in gauge_funcs.items():
+			try:
+				gauges[key] = func()
+			except Exception:
+				continue
+
+		lines = []
+		for kind, values in [('counter', counters), ('gauge', gauges)]:
+			for name in sorted(set(name for name, _ in values)):
+				lines.append('# TYPE %s %s' % (name, kind))
+				for (metric, labels), value in sorted(values.items()):
+					if metric == name:
+						lines.append('%s%s %s' % (name, format_labels(labels), value))
+
+		for name in sorted(set(name for name, _ in histograms)):
+			lines.append('# TYPE %s histogram' % name)
+			for (metric, labels), histogram in sorted(histograms.items()):
+				if metric != name:
+					continue
+				cumulative = 0
+				for bound, count in zip(self.buckets, histogram):
+					cumulative += count
+					lines.append('%s_bucket%s %d' % (name, format_labels(labels + (('le', bound),)), cumulative))
+				lines.append('%s_bucket%s %d' % (name, format_labels(labels + (('le', '+Inf'),)), histogram[-1]))
+				lines.append('%s_sum%s %s' % (name, format_labels(labels), histogram[-2]))
+				lines.append('%s_count%s %d' % (name, format_labels(labels), histogram[-1]))
+
+		return '\n'.join(lines) + '\n'
+
+
+	"""
+	Enable the metrics and serve them at http://host:port/metrics from a daemon thread
+	"""
+	def serve(self, port=9108, host='127.0.0.1'):
+
+		from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+		self.enabled = True
+		metrics = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split('?')[0] not in ['/', '/metrics']:
+					self.send_error(404)
+					return
+				body = metrics.render().encode()
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer((host, port), Handler)
+		threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+		print('Serving metrics on http://%s:%d/metrics' % (host, port))
+
+
+	"""
+	Profile the calling thread and the event loop thread with cProfile until stop_profile()
+	"""
+	def start_profile(self):
+
+		import cProfile
+		from apis.event_loop import get_loop
+		self.profiles = [cProfile.Profile(), cProfile.Profile()]
+		self.profiles[0].enable()
+		get_loop().call_soon_threadsafe(self.profiles[1].enable)
+
+
+	"""
+	Stop profiling and write the combined stats to path (read them with pstats or snakeviz)
+	"""
+	def stop_profile(self, path):
+
+		if self.profiles is None:
+			return
+		import pstats
+		from apis.event_loop import get_loop
+		main_profile, loop_profile = self.profiles
+		self.profiles = None
+		main_profile.disable()
+		stopped = threading.Event()
+		get_loop().call_soon_threadsafe(lambda : (loop_profile.disable(), stopped.set()))
+		stopped.wait(5)
+
+		stats = pstats.Stats(main_profile)
+		try:
+			stats.add(loop_profile)
+		except TypeError:
+			pass
+		stats.dump_stats(path)
+		print('Wrote profile to %s' % path)
+
+
+def format_labels(labels):
+	if not labels:
+		return ''
+	return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+
+
+null_timer = contextlib.nullcontext()
+
+# Shared by the whole process
+metrics = Metrics()
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from tzlocal import get_localzone
+from candle_store import CandleStore
+from indicators import batch
+
+
+_epoch_day = date(1970, 1, 1).toordinal()
+
+
+"""
+Candles of many coins aligned on one time axis, every field is a 2-D array (time x coin) and auxiliary series like
+the fear and greed index are 1-D arrays on the same axis, a coin missing a candle (not listed yet, gaps) has nan there
+fields[name][:, panel.col[coin]] is one coin's column without copying, series are shared by every coin
+"""
+class Panel:
+
+	def __init__(self, timestamps, coins, fields, series=None):
+		self.timestamps = np.asarray(timestamps, dtype=np.int64) # ms UTC
+		self.coins = list(coins)
+		self.col = {coin:j for j, coin in enumerate(self.coins)}
+		self.fields = fields
+		self.series = series or {}
+		self._index = None
+
+
+	"""
+	Load the candles of many symbols from a CandleStore {coin: symbol} (or a list of symbols, the coin is the base)
+	"""
+	@classmethod
+	def from_store(cls, store, exchange, symbols, interval='1d', since=None, until=None, fields=('open', 'high', 'low', 'close', 'volume')):
+
+		store = store or CandleStore()
+		if not isinstance(symbols, dict):
+			symbols = {symbol.split('/')[0]:symbol for symbol in symbols}
+		candles = {coin:store.load(exchange, symbol, interval, since=since, until=until) for coin, symbol in symbols.items()}
+		timestamps = np.unique(np.concatenate([np.asarray(c['timestamp']) for c in candles.values()])) if candles else np.empty(0, dtype=np.int64)
+
+		panel_fields = {name:np.full((len(timestamps), len(candles)), np.nan) for name in fields}
+		for j, c in enumerate(candles.values()):
+			rows = np.searchsorted(timestamps, c['timestamp'])
+			for name in fields:
+				panel_fields[name][rows, j] = c[name]
+		return cls(timestamps, list(candles), panel_fields)
+
+
+	"""
+	Panel from DataFrames {coin: df} indexed by local datetime like the notebook's all_tickers frames
+	"""
+	@classmethod
+	def from_frames(cls, frames, fields=('open', 'high', 'low', 'close', 'volume')):
+
+		stamps = [df.index.to_numpy(dtype='datetime64[ns]') for df in frames.values()]
+		index = pd.DatetimeIndex(np.unique(np.concatenate(stamps)) if frames else [])
+		panel_fields = {}
+		for name in fields:
+			if frames and all(name in df for df in frames.values()):
+				panel_fields[name] = np.full((len(index), len(frames)), np.nan)
+				for j, (df, values) in enumerate(zip(frames.values(), stamps)):
+					panel_fields[name][index.searchsorted(values), j] = df[name].to_numpy(dtype=float)
+		local = index.tz_localize(get_localzone(), ambiguous=np.zeros(len(index), dtype=bool), nonexistent='shift_forward')
+		timestamps = local.tz_convert('UTC').asi8 // 10**6 if len(index) else np.empty(0, dtype=np.int64)
+		panel = cls(timestamps, list(frames), panel_fields)
+		panel._index = index
+		return panel
+
+
+	# Local datetimes of the rows like candles_to_pandas
+	@property
+	def index(self):
+		if self._index is None:
+			self._index = pd.to_datetime(self.timestamps, unit='ms', utc=True).tz_convert(get_localzone()).tz_localize(None)
+		return self._index
+
+
+	# UTC day number (days since 1970-01-01) of every row
+	@property
+	def days(self):
+		return self.timestamps // 86400000
+
+
+	def __getitem__(self, name):
+		return self.fields[name] if name in self.fields else self.series[name]
+
+
+	def __len__(self):
+		return len(self.timestamps)
+
+
+	"""
+	Add a series aligned by UTC date from {'2021-09-13': value, ...} (like FearGreedHistory.values) or a pandas Series
+	indexed by date, rows on days without a value get nan
+	"""
+	def add_daily(self, name, values):
+
+		if isinstance(values, pd.Series):
+			values = {pd.Timestamp(day).date().isoformat():value for day, value in values.items()}
+		days = np.array(sorted(date.fromisoformat(day).toordinal() - _epoch_day for day in values), dtype=np.int64)
+		daily = np.array([values[date.fromordinal(int(day) + _epoch_day).isoformat()] for day in days], dtype=float)
+
+		aligned = np.full(len(self), np.nan)
+		if len(days):
+			i = np.minimum(np.searchsorted(days, self.days), len(days) - 1)
+			found = days[i] == self.days
+			aligned[found] = daily[i[found]]
+		self.series[name] = aligned
+		return aligned
+
+
+	"""
+	Add the indicators.batch values of every coin as fields (rsi, volatility, drawdown, moving averages)
+	"""
+	def add_indicators(self, **settings):
+
+		for j in range(len(self.coins)):
+			valid = ~np.isnan(self.fields['close'][:, j])
+			values = batch(self.fields['high'][valid, j], self.fields['close'][valid, j], **settings)
+			for name, column in values.items():
+				if name == 'close':
+					continue
+				if name not in self.fields:
+					self.fields[name] = np.full(self.fields['close'].shape, np.nan)
+				self.fields[name][valid, j] = column
+
+
+	"""
+	Every field and series by name for a strategy's weights, series get a coin axis of 1 so they broadcast across coins
+	"""
+	def inputs(self):
+		return dict(self.fields, **{name:values[:, None] for name, values in self.series.items()})
+
+
+	"""
+	One coin as a DataFrame indexed by local datetime (the rows it has candles for) with the series as columns
+	"""
+	def frame(self, coin):
+		j = self.col[coin]
+		valid = ~np.isnan(self.fields['open'][:, j])
+		columns = {name:values[valid, j] for name, values in self.fields.items()}
+		columns.update({name:values[valid] for name, values in self.series.items()})
+		return pd.DataFrame(columns, index=self.index[valid])
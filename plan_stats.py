@@ -0,0 +1,121 @@
+import time
+from datetime import datetime
+
+
+"""
+Running totals of the trades of one DCA plan
+Totals are updated as each trade lands and the rolling windows (days) keep one bucket per day in a ring buffer
+as long as the longest window, moving to a new day subtracts the buckets that fell out of each window
+so adding a trade and reading the stats cost the same however long the history is
+"""
+class PlanStats:
+
+	def __init__(self, windows=(7, 30, 365)):
+		self.windows = windows
+		self.size = max(windows)
+		self.spent = 0
+		self.amount = 0
+		self.fees = {} # {currency: cost}
+		self.count = 0
+		self.day = None # Latest day number in the ring
+		self.bucket_day = [None] * self.size
+		self.bucket_spent = [0] * self.size
+		self.bucket_amount = [0] * self.size
+		self.window_spent = {w:0 for w in windows}
+		self.window_amount = {w:0 for w in windows}
+
+
+	"""
+	Add a filled trade, returns False for trades without a cost and amount (failed or skipped orders)
+	"""
+	def add(self, trade):
+
+		if not trade or trade.get('cost') is None or not trade.get('amount'):
+			return False
+		cost, amount = trade['cost'], trade['amount']
+
+		self.spent += cost
+		self.amount += amount
+		self.count += 1
+		if trade.get('fee') and trade['fee'].get('cost') is not None:
+			currency = trade['fee'].get('currency')
+			self.fees[currency] = self.fees.get(currency, 0) + trade['fee']['cost']
+
+		day = int(trade_time(trade) // 86400)
+		self.advance(day)
+		if self.day - day >= self.size:
+			return True
+
+		# A day before the first trade hasn't been given its bucket yet
+		i = day % self.size
+		self.bucket_day[i] = day
+		self.bucket_spent[i] += cost
+		self.bucket_amount[i] += amount
+		for w in self.windows:
+			if self.day - day < w:
+				self.window_spent[w] += cost
+				self.window_amount[w] += amount
+		return True
+
+
+	# Move the ring forward to day, dropping the days that leave each window
+	def advance(self, day):
+
+		if self.day is not None and day <= self.day:
+			return
+		if self.day is None or day - self.day >= self.size:
+			self.bucket_day = [None] * self.size
+			self.bucket_spent = [0] * self.size
+			self.bucket_amount = [0] * self.size
+			self.window_spent = {w:0 for w in self.windows}
+			self.window_amount = {w:0 for w in self.windows}
+			self.bucket_day[day % self.size] = day
+			self.day = day
+			return
+
+		for d in range(self.day + 1, day + 1):
+			for w in self.windows:
+				i = (d - w) % self.size
+				if self.bucket_day[i] == d - w:
+					self.window_spent[w] -= self.bucket_spent[i]
+					self.window_amount[w] -= self.bucket_amount[i]
+			i = d % self.size
+			self.bucket_day[i] = d
+			self.bucket_spent[i] = 0
+			self.bucket_amount[i] = 0
+		self.day = day
+
+
+	@property
+	def avg_cost(self):
+		return self.spent / self.amount if self.amount else None
+
+
+	"""
+	Spent, amount, average cost and spend per day over the last days up to now
+	"""
+	def window(self, days, now=None):
+
+		self.advance(int((now or time.time()) // 86400))
+		spent, amount = self.window_spent[days], self.window_amount[days]
+		return {'spent':spent, 'amount':amount, 'avg_cost':spent / amount if amount else None, 'spend_rate':spent / days}
+
+
+	def summary(self, now=None):
+		return {'spent':self.spent, 'amount':self.amount, 'fees':dict(self.fees), 'count':self.count, 'avg_cost':self.avg_cost,
+			'windows':{w:self.window(w, now) for w in self.windows}}
+
+
+"""
+Unix time of a trade, the exchange timestamp if there is one otherwise when it was scheduled or now
+"""
+def trade_time(trade):
+
+	if trade.get('timestamp'):
+		return trade['timestamp'] / 1000
+	scheduled = trade.get('scheduled')
+	if isinstance(scheduled, str):
+		scheduled = datetime.fromisoformat(scheduled)
+	if isinstance(scheduled, datetime):
+		return scheduled.timestamp()
+	return time.time()
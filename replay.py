@@ -0,0 +1,128 @@
+import io
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+import strategies
+from clock import VirtualClock
+from candle_store import CandleStore, interval_ms
+from indicators import IndicatorEngine
+from downloader import Downloader
+from trade_journal import TradeJournal
+from apis.price_feed import ReplayFeed
+from apis.event_loop import run_sync, spawn
+from apis.registry import exchanges, public_keys
+from dca import DCA, parse_frequency
+
+
+"""
+Replay DCA plans over history through the live DCA class: manage_dcas schedules the buys, the strategies weight them
+and the adapter simulates them, only the clock and the prices are swapped for a VirtualClock and the stored candles
+The clock jumps from one buy to the next so years of buys run in seconds
+plans are add_dcas plans with their start_time in the replayed period, prices are the open of the interval candle each
+buy falls in (downloaded into the candle store first if they don't cover the period) and fear and greed weighted plans
+use the value of the day being replayed
+Returns the DCA after the replay, its previous_buys and plan_stats hold the results, the state and journal written in root are deleted unless root is given
+"""
+def replay(plans, start, end, exchange_name='binance', hold_coin='USDT', interval='1h', store=None, quiet=True, root=None):
+
+	clock = VirtualClock(start, end)
+	store = store or CandleStore()
+	keep = root is not None
+	root = root or tempfile.mkdtemp(prefix='replay_')
+	output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+
+	dca = DCA('replay', simulate=True, api_keys=public_keys(exchange_name), state_root=os.path.join(root, 'saved_dca'),
+		journal=TradeJournal(os.path.join(root, 'prev_trades')), clock=clock)
+	dca.exchange_name, dca.hold_coin = exchange_name, hold_coin
+	# The replay's state is thrown away, it is logged without fsyncs and only compacted at the end
+	dca.state.durable, dca.state.snapshot_every = False, float('inf')
+	dca.connect(exchange_name)
+	core = dca.api.core
+	symbols = sorted(set('%s/%s' % (plan['coin'], hold_coin) for plan in plans))
+
+	# Only the candles missing from the store are downloaded
+	since, until = int(start.timestamp() * 1000) - interval_ms(interval), int(end.timestamp() * 1000) - interval_ms(interval)
+	stale = [symbol for symbol in symbols if (store.last_timestamp(core.name, symbol, interval) or 0) < until]
+	if stale:
+		print('Downloading %s candles of %s' % (interval, ', '.join(stale)))
+		run_sync(download(store, core, stale, interval, since))
+
+	# Indicators start from the whole history of their candles and move forward with the clock
+	dca.indicators = IndicatorEngine(store, os.path.join(root, 'indicators'))
+	indicator_interval = dca.indicators.interval
+	indicator_symbols = sorted(set('%s/%s' % (plan['coin'], hold_coin) for plan in plans
+		if any(name in dca.indicators.names for name in strategies.get(plan['strategy']).inputs)))
+	stale = [symbol for symbol in indicator_symbols if (store.last_timestamp(core.name, symbol, indicator_interval) or 0) < int(end.timestamp() * 1000) - interval_ms(indicator_interval)]
+	if stale:
+		print('Downloading %s candles of %s for their indicators' % (indicator_interval, ', '.join(stale)))
+		run_sync(download(store, core, stale, indicator_interval, 0))
+	for symbol in symbols:
+		first = store.meta(core.name, symbol, interval)['first']
+		if first is None or first > since + interval_ms(interval):
+			print('%s candles only start at %s, earlier buys fail' % (symbol, first and datetime.fromtimestamp(first / 1000)))
+	dca.price_feed = ReplayFeed.from_candles(store, core.name, symbols, interval, clock=clock.time)
+
+	if any('fear_greed' in strategies.get(plan['strategy']).inputs for plan in plans):
+		try:
+			dca.fg_history.refresh()
+		except Exception as e:
+			print('Error updating fear and greed history: %s' % e)
+
+	with output:
+		# Plans go in before the scheduler starts so it doesn't find nothing to do and finish
+		dca.add_dcas(plans)
+		task = spawn(dca.manage_dcas())
+		run_sync(clock.finished.wait())
+		task.cancel()
+		dca.shutdown()
+	if not keep:
+		shutil.rmtree(root, ignore_errors=True)
+	return dca
+
+
+# Download the candles of many symbols at once under the adapter's rate limit
+async def download(store, core, symbols, interval, since):
+	results = await Downloader(store, core, quiet=True).run([(symbol, interval) for symbol in symbols], since, limit=exchanges.get(core.name, {}).get('ohlcv_limit'))
+	for (symbol, interval), result in results.items():
+		if isinstance(result, Exception):
+			print('Error downloading %s candles: %s' % (symbol, result))
+
+
+"""
+Replay the plans of a config file in the dca.py -c format over a period
+	python replay.py config.json --start 2021-01-01 --end 2023-01-01
+"""
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Replay DCA plans over history through the live bot')
+	parser.add_argument('config')
+	parser.add_argument('--start', required=True, type=datetime.fromisoformat)
+	parser.add_argument('--end', default=datetime.now(), type=datetime.fromisoformat)
+	parser.add_argument('--interval', default='1h', help='candle interval the buys are priced from')
+	parser.add_argument('-v', action='store_true', help='print the bot output')
+	args = parser.parse_args()
+
+	with open(args.config, 'r') as json_file:
+		config = json.load(json_file)
+
+	for exchange_name, exchange_config in config['exchanges'].items():
+		hold_coin = exchange_config.get('hold', exchanges[exchange_name]['hold'])
+		plans = []
+		for plan in exchange_config.get('plans', []):
+			hours, minutes = plan.get('start', '00:00').split(':')
+			plans.append({'coin':plan['coin'].upper(), 'amount':float(plan['amount']), 'frequency':parse_frequency(plan.get('frequency', '1D')),
+				'start_time':args.start.replace(hour=int(hours), minute=int(minutes)), 'strategy':plan.get('strategy', 'r'), 'params':plan.get('params')})
+
+		t0 = datetime.now()
+		dca = replay(plans, args.start, args.end, exchange_name, hold_coin, args.interval, quiet=not args.v)
+		elapsed = (datetime.now() - t0).total_seconds()
+
+		print('\n%s: %d buys from %s to %s replayed in %.2fs\n' % (exchange_name, sum(len(t) for t in dca.previous_buys.values()), args.start, args.end, elapsed))
+		print('%8s %8s %12s %14s %14s' % ('coin', 'buys', 'spent', 'amount', 'avg cost'))
+		for coin, stats in dca.plan_stats.items():
+			print('%8s %8d %12.2f %14.6f %14.6f' % (coin, stats.count, stats.spent, stats.amount, stats.avg_cost or 0))
@@ -42,3 +42,14 @@ def save_obj(obj):
 
 	return obj
 
+
+
+# json.dump default that converts without touching the object being saved, functions are left out as None
+def json_default(obj):
+	if isinstance(obj, datetime):
+		return obj.isoformat()
+	if isinstance(obj, set):
+		return list(obj)
+	if callable(obj):
+		return None
+	return str(obj)
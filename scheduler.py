@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+
+"""
+Priority queue of wakeup times for the DCA plans
+Each plan id (the coin) has at most one pending wakeup, rescheduling or cancelling
+a plan marks its old heap entry as removed so every operation is O(log n)
+"""
+class Scheduler:
+
+	def __init__(self):
+		self.heap = [] # [[datetime1, seq1, coin1], [datetime2, seq2, coin2]]
+		self.entries = {}
+		self.counter = itertools.count()
+		self.lock = threading.Lock()
+
+
+	"""
+	Number of plans waiting to be woken up
+	"""
+	def __len__(self):
+		return len(self.entries)
+
+
+	def __contains__(self, plan_id):
+		return plan_id in self.entries
+
+
+	"""
+	Add a plan at time t or move it there if it is already scheduled
+	"""
+	def schedule(self, plan_id, t):
+		with self.lock:
+			self._remove(plan_id)
+			entry = [t, next(self.counter), plan_id]
+			self.entries[plan_id] = entry
+			heapq.heappush(self.heap, entry)
+
+			# Rebuild the heap if it is mostly removed entries from rescheduling
+			if len(self.heap) > 2 * len(self.entries) + 64:
+				self.heap = [e for e in self.heap if e[-1] is not None]
+				heapq.heapify(self.heap)
+
+
+	"""
+	Add or move many plans [[t, plan_id], ...] at once with a single heap rebuild, the last time given for a plan wins
+	"""
+	def schedule_many(self, items):
+		items = {plan_id:t for t, plan_id in items}
+		with self.lock:
+			for plan_id, t in items.items():
+				self._remove(plan_id)
+				self.entries[plan_id] = [t, next(self.counter), plan_id]
+			self.heap = [e for e in self.heap if e[-1] is not None] + [self.entries[plan_id] for plan_id in items]
+			heapq.heapify(self.heap)
+
+
+	"""
+	Remove a plan from the schedule, returns the time it was due or None
+	"""
+	def cancel(self, plan_id):
+		with self.lock:
+			entry = self._remove(plan_id)
+			return entry[0] if entry else None
+
+
+	"""
+	Time the plan is next due or None if it isn't scheduled
+	"""
+	def time_of(self, plan_id):
+		with self.lock:
+			entry = self.entries.get(plan_id)
+			return entry[0] if entry else None
+
+
+	"""
+	Earliest wakeup time or None if nothing is scheduled
+	"""
+	def next_time(self):
+		with self.lock:
+			self._drop_removed()
+			return self.heap[0][0] if self.heap else None
+
+
+	"""
+	Pop every plan due at or before now in time order as [[datetime, coin], ...]
+	"""
+	def pop_due(self, now=None):
+		now = now or datetime.now()
+		due = []
+		with self.lock:
+			self._drop_removed()
+			while self.heap and self.heap[0][0] <= now:
+				t, _, plan_id = heapq.heappop(self.heap)
+				del self.entries[plan_id]
+				due.append([t, plan_id])
+				self._drop_removed()
+		return due
+
+
+	"""
+	All scheduled wakeups sorted by time as [[datetime, coin], ...] for saving and reporting
+	"""
+	def items(self):
+		with self.lock:
+			return [[entry[0], entry[2]] for entry in sorted(self.entries.values())]
+
+
+	# Mark the entry for a plan as removed, it is discarded when it reaches the top of the heap
+	def _remove(self, plan_id):
+		entry = self.entries.pop(plan_id, None)
+		if entry is not None:
+			entry[-1] = None
+		return entry
+
+
+	# Discard removed entries from the top of the heap
+	def _drop_removed(self):
+		while self.heap and self.heap[0][-1] is None:
+			heapq.heappop(self.heap)
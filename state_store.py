@@ -0,0 +1,235 @@
+import os
+import json
+import threading
+from datetime import datetime
+from save import json_default
+from metrics import metrics
+
+
+"""
+Write-ahead log of DCA state changes with periodic compacted snapshots
+Every change (settings, plan added, trade recorded, next wakeup moved, amount carried) is a JSON line appended to wal.jsonl and fsynced
+snapshot.json holds the whole state up to a sequence number, it is written to a temporary file and renamed into place,
+loading replays the log records newer than the snapshot on top of it
+snapshot_state is called under lock to get the state to compact into a snapshot, it has to return a copy that later
+changes don't touch as it is serialized after the lock is released, the log is moved to wal.jsonl.old at the same
+time so new records go to a new log while the snapshot is written and the old log is deleted once it is in place
+durable=False skips the fsyncs for state that is thrown away (replays)
+"""
+class StateStore:
+
+	def __init__(self, root='saved_dca', snapshot_state=None, snapshot_every=500, lock=None, durable=True):
+		self.root = root
+		self.snapshot_state = snapshot_state
+		self.snapshot_every = snapshot_every
+		self.durable = durable
+		self.lock = lock or threading.RLock()
+		self.snapshotting = threading.Lock()
+		self.seq = 0
+		self.since_snapshot = 0
+		self.wal = None
+
+
+	def path(self, name):
+		return os.path.join(self.root, name)
+
+
+	"""
+	Append records {'op':..} to the log with one write and fsync, compacts into a snapshot every snapshot_every records
+	on a background thread so the caller (which may hold the lock) doesn't wait for it
+	"""
+	def log(self, *records):
+
+		with self.lock, metrics.timer('state_log_seconds'):
+			if self.wal is None:
+				os.makedirs(self.root, exist_ok=True)
+				self.wal = open(self.path('wal.jsonl'), 'a')
+
+			lines = ''
+			for record in records:
+				self.seq += 1
+				lines += json.dumps(dict(record, seq=self.seq), default=json_default) + '\n'
+			self.wal.write(lines)
+			self.wal.flush()
+			if self.durable:
+				os.fsync(self.wal.fileno())
+
+			self.since_snapshot += len(records)
+			if self.snapshot_state is not None and self.since_snapshot >= self.snapshot_every and not self.snapshotting.locked():
+				self.since_snapshot = 0
+				threading.Thread(target=self.snapshot, name='snapshot', daemon=True).start()
+
+
+	"""
+	Write the whole state to snapshot.json and drop the log it covers
+	The lock is only held to copy the state and move the log aside, the copy is serialized without it
+	"""
+	def snapshot(self):
+
+		with self.snapshotting, metrics.timer('state_snapshot_seconds'):
+			with self.lock:
+				os.makedirs(self.root, exist_ok=True)
+				state = dict(self.snapshot_state(), seq=self.seq, saved=datetime.now())
+				if self.wal is not None:
+					self.wal.close()
+					self.wal = None
+				self.rotate_log()
+				self.since_snapshot = 0
+
+			with open(self.path('snapshot.json.tmp'), 'w') as json_file:
+				json.dump(state, json_file, default=json_default)
+				json_file.flush()
+				if self.durable:
+					os.fsync(json_file.fileno())
+			os.replace(self.path('snapshot.json.tmp'), self.path('snapshot.json'))
+
+			# Everything in the old log is in the snapshot
+			if os.path.isfile(self.path('wal.jsonl.old')):
+				os.remove(self.path('wal.jsonl.old'))
+
+
+	# Move the log to wal.jsonl.old, added to the end of one left by a snapshot that didn't finish
+	def rotate_log(self):
+		if not os.path.isfile(self.path('wal.jsonl')):
+			return
+		if os.path.isfile(self.path('wal.jsonl.old')):
+			with open(self.path('wal.jsonl'), 'rb') as wal_file, open(self.path('wal.jsonl.old'), 'ab') as old_file:
+				old_file.write(wal_file.read())
+				old_file.flush()
+				if self.durable:
+					os.fsync(old_file.fileno())
+			os.remove(self.path('wal.jsonl'))
+		else:
+			os.replace(self.path('wal.jsonl'), self.path('wal.jsonl.old'))
+
+
+	"""
+	State from the snapshot and the log after it, None if nothing was saved
+	Saves from older versions (one timestamped json per save) are used as the snapshot if there is no snapshot.json
+	"""
+	def load(self):
+
+		with self.lock:
+			state = None
+			if os.path.isfile(self.path('snapshot.json')):
+				with open(self.path('snapshot.json'), 'r') as json_file:
+					state = json.load(json_file)
+			elif self.legacy_files():
+				with open(self.path(self.legacy_files()[-1]), 'r') as json_file:
+					state = json.load(json_file)
+
+			records = self.read_log('wal.jsonl.old') + self.read_log()
+			if state is None and not records:
+				return None
+
+			state = state or {}
+			for key, default in [('crypto_amounts', {}), ('previous_buys', {}), ('dca_dict', {}), ('wakeup_times', []), ('carry', {})]:
+				state.setdefault(key, default)
+			self.seq = state.get('seq', 0)
+
+			# Replay the changes made since the snapshot
+			trade_ids = {coin:{t['id']:i for i, t in enumerate(trades) if t and t.get('id') is not None} for coin, trades in state['previous_buys'].items()}
+			wakeups = {coin:t for t, coin in state['wakeup_times']}
+			self.since_snapshot = 0
+			for record in records:
+				if record['seq'] <= self.seq:
+					continue
+				self.apply(state, record, trade_ids, wakeups)
+				self.seq = record['seq']
+				self.since_snapshot += 1
+			state['wakeup_times'] = sorted([t, coin] for coin, t in wakeups.items())
+
+			return state
+
+
+	# Apply one log record to a loaded state
+	def apply(self, state, record, trade_ids, wakeups):
+
+		op = record['op']
+		if op == 'set':
+			state.update(record['fields'])
+		elif op == 'plan':
+			state['dca_dict'][record['coin']] = record['plan']
+			state['previous_buys'].setdefault(record['coin'], [])
+		elif op == 'trade':
+			# A trade that was logged again when its order was final replaces the first record of it
+			trades = state['previous_buys'].setdefault(record['coin'], [])
+			ids = trade_ids.setdefault(record['coin'], {})
+			trade = record['trade']
+			if trade and trade.get('id') in ids:
+				trades[ids[trade['id']]] = trade
+			else:
+				if trade and trade.get('id') is not None:
+					ids[trade['id']] = len(trades)
+				trades.append(trade)
+		elif op == 'wakeup':
+			wakeups[record['coin']] = record['time']
+		elif op == 'carry':
+			state['carry'][record['coin']] = record['amount']
+
+
+	# Complete records in a log, a line cut off by a crash is removed from the file
+	def read_log(self, name='wal.jsonl'):
+
+		records = []
+		good = 0
+		try:
+			with open(self.path(name), 'rb') as wal_file:
+				for line in wal_file:
+					try:
+						records.append(json.loads(line))
+					except ValueError:
+						break
+					good += len(line)
+		except FileNotFoundError:
+			return records
+
+		if good != os.path.getsize(self.path(name)):
+			with open(self.path(name), 'r+b') as wal_file:
+				wal_file.truncate(good)
+		return records
+
+
+	# Save files from older versions named <yy_mm_dd-HH_MM_SS>_<sim/live>.json
+	def legacy_files(self):
+		if not os.path.isdir(self.root):
+			return []
+		return sorted(f for f in os.listdir(self.root) if f.endswith(('_sim.json', '_live.json')))
+
+
+	"""
+	When the state was last changed, None if nothing was saved
+	"""
+	def saved_time(self):
+
+		times = [os.path.getmtime(self.path(f)) for f in ['snapshot.json', 'wal.jsonl', 'wal.jsonl.old'] if os.path.isfile(self.path(f)) and os.path.getsize(self.path(f))]
+		if times:
+			return datetime.fromtimestamp(max(times))
+		if self.legacy_files():
+			return datetime.strptime(self.legacy_files()[-1][:17], '%y_%m_%d-%H_%M_%S')
+
+
+	"""
+	Start from an empty state, the previous saves are moved to archive/<date>/
+	"""
+	def reset(self):
+
+		with self.snapshotting, self.lock:
+			if self.wal is not None:
+				self.wal.close()
+				self.wal = None
+			old = [f for f in ['snapshot.json', 'wal.jsonl', 'wal.jsonl.old'] if os.path.isfile(self.path(f))] + self.legacy_files()
+			if old:
+				archive = self.path(os.path.join('archive', datetime.now().strftime('%y_%m_%d-%H_%M_%S')))
+				os.makedirs(archive, exist_ok=True)
+				for f in old:
+					os.replace(self.path(f), os.path.join(archive, f))
+			self.seq = 0
+			self.since_snapshot = 0
+
+
+	def close(self):
+		with self.snapshotting, self.lock:
+			if self.wal is not None:
+				self.wal.close()
+				self.wal = None
@@ -0,0 +1,134 @@
+from lazy import lazy_module
+
+np = lazy_module('numpy')
+
+
+"""
+Weighting curves of the fear and greed index (0-100) giving the buy multiplier
+Work on single values and whole arrays
+"""
+curves = {
+	'Constant': lambda x : np.ones_like(x, dtype=float),
+	'Linear': lambda x : 2*(100-np.asarray(x, dtype=float))/100,
+	'Shallow': lambda x : 1.5*(150-np.asarray(x, dtype=float))/150,
+	'Aggressive': lambda x : np.clip(3*(100-np.asarray(x, dtype=float))/100-0.5, 0, 2),
+	'V_aggressive': lambda x : np.clip(5*(100-np.asarray(x, dtype=float))/100-1.5, 0, 2),
+	'Vv_aggressive': lambda x : np.clip(8*(100-np.asarray(x, dtype=float))/100-3, 0, 2),
+	'Hinge': lambda x : np.maximum(2*(100-np.asarray(x, dtype=float))/100, 0.5),
+	'Logistic': lambda x : -2/(1+np.exp(-0.1*(np.asarray(x, dtype=float)-50)))+2,
+	'Logistic_steep': lambda x : -2/(1+np.exp(-0.17*(np.asarray(x, dtype=float)-50)))+2,
+}
+
+
+"""
+A DCA strategy: a function of its input series (by name, e.g. 'fear_greed') and its parameters giving the buy multiplier
+The function is written once with NumPy and works on single values for the live bot and whole arrays for backtests
+params are the defaults of every parameter, choices the allowed values of the parameters that have a fixed set
+"""
+class Strategy:
+
+	def __init__(self, name, func, inputs=(), params=None, choices=None, description=''):
+		self.name = name
+		self.func = func
+		self.inputs = tuple(inputs)
+		self.params = params or {}
+		self.choices = choices or {}
+		self.description = description or name
+
+
+	"""
+	The defaults updated with params, raises ValueError for unknown parameters or values not in their choices
+	"""
+	def check(self, params=None):
+
+		params = params or {}
+		unknown = set(params) - set(self.params)
+		if unknown:
+			raise ValueError('Unknown parameters %s for strategy %s, it takes %s' % (', '.join(sorted(unknown)), self.name, ', '.join(self.params) or 'none'))
+		checked = dict(self.params, **params)
+		for name, allowed in self.choices.items():
+			if checked[name] not in allowed:
+				raise ValueError('%s %s of strategy %s is not one of %s' % (name, checked[name], self.name, ', '.join(allowed)))
+		return checked
+
+
+	"""
+	Multiplier for one buy from the current value of each input {name: value}
+	"""
+	def weight(self, values, **params):
+		return float(self.func(*[values[name] for name in self.inputs], **self.check(params)))
+
+
+	"""
+	Multipliers for every row of data (a DataFrame or dictionary of arrays with a column per input) in one call
+	Strategies without inputs return a single multiplier that broadcasts over the rows
+	"""
+	def weights(self, data, **params):
+		return self.func(*[np.asarray(data[name], dtype=float) for name in self.inputs], **self.check(params))
+
+
+	def __repr__(self):
+		return 'Strategy(%s)' % self.name
+
+
+# Every strategy by name, short names are kept for the saved plans and prompts that use them
+registry = {}
+aliases = {'r':'regular', 'f':'fear_greed'}
+
+
+"""
+Decorator registering a strategy function under name
+"""
+def register(name, inputs=(), params=None, choices=None, description=''):
+	def decorator(func):
+		registry[name] = Strategy(name, func, inputs, params, choices, description)
+		return func
+	return decorator
+
+
+"""
+Strategy by name or short name, raises ValueError when there isn't one
+"""
+def get(name):
+	name = aliases.get(name, name)
+	if name not in registry:
+		raise ValueError('Unknown strategy %s, use one of %s' % (name, ', '.join(sorted(registry))))
+	return registry[name]
+
+
+@register('regular', description='regular dca')
+def regular():
+	return 1.0
+
+
+"""
+Buy more when there is fear and less when there is greed, aggression is a power on the multiplier
+(0 is a regular dca, above 1 buys even more in fear and less in greed)
+"""
+@register('fear_greed', inputs=['fear_greed'], params={'curve':'Logistic_steep', 'aggression':1}, choices={'curve':curves}, description='fear_greed')
+def fear_greed(fear_greed, curve='Logistic_steep', aggression=1):
+	return curves[curve](fear_greed) ** aggression
+
+
+"""
+Buy more when the RSI is low, the multiplier goes from 2 at low down to 0 at high (1 half way)
+"""
+@register('rsi', inputs=['rsi'], params={'low':30, 'high':70}, description='rsi')
+def rsi(rsi, low=30, high=70):
+	return np.clip(2*(high-np.asarray(rsi, dtype=float))/(high-low), 0, 2)
+
+
+"""
+Buy more when the market is more volatile than target (volatility of the daily log returns)
+"""
+@register('volatility', inputs=['volatility'], params={'target':0.04, 'min_weight':0.5, 'max_weight':2}, description='volatility')
+def volatility(volatility, target=0.04, min_weight=0.5, max_weight=2):
+	return np.clip(np.asarray(volatility, dtype=float)/target, min_weight, max_weight)
+
+
+"""
+Buy more the further the price is below its all time high, scale extra for every 100% down
+"""
+@register('drawdown', inputs=['drawdown'], params={'scale':2, 'max_weight':3}, description='drawdown from ath')
+def drawdown(drawdown, scale=2, max_weight=3):
+	return np.minimum(1-scale*np.asarray(drawdown, dtype=float), max_weight)
@@ -0,0 +1,138 @@
+import time
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+from backtest import dca_arrays, weightings
+
+
+# Arrays shared with the worker processes {ticker: {'dates':..., 'open':..., 'fear_greed':...}}
+_shared = {}
+_weightings = weightings
+
+
+"""
+Build the list of backtest configurations from every combination of the parameters
+"""
+def param_grid(tickers, weighting, freq_d, dollar, amount, since):
+
+	keys = ['ticker', 'weighting', 'freq_d', 'dollar', 'amount', 'since']
+	values = [tickers, weighting, freq_d, dollar, amount, since]
+	values = [v if isinstance(v, (list, tuple, np.ndarray, pd.Index)) else [v] for v in values]
+	return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+"""
+Copy the price and fear and greed columns of each ticker into shared memory once
+data is {ticker: DataFrame with a datetime index and open/fear_greed columns}
+Returns the shared memory blocks (to unlink later) and the specs workers attach with
+"""
+def share_data(data):
+
+	blocks, specs = [], {}
+	for ticker, df in data.items():
+		columns = {
+			'dates': pd.to_datetime(df.index).to_numpy(dtype='datetime64[ns]').view(np.int64),
+			'open': df.open.to_numpy(dtype=float),
+			'fear_greed': df.fear_greed.to_numpy(dtype=float) if 'fear_greed' in df else np.full(len(df), np.nan),
+		}
+		specs[ticker] = {}
+		for name, array in columns.items():
+			block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+			np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+			blocks.append(block)
+			specs[ticker][name] = (block.name, array.shape, array.dtype.str)
+
+	return blocks, specs
+
+
+# Attach to the shared arrays in a worker process
+def _init_worker(specs, custom_weightings):
+
+	global _weightings
+	_shared.clear()
+	_shared['blocks'] = []
+	for ticker, columns in specs.items():
+		_shared[ticker] = {}
+		for name, (block_name, shape, dtype) in columns.items():
+			block = shared_memory.SharedMemory(name=block_name)
+			_shared['blocks'].append(block)
+			_shared[ticker][name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+	_weightings = dict(weightings, **(custom_weightings or {}))
+
+
+# Drop the views of the shared arrays and detach from them
+def _close_worker():
+
+	blocks = _shared.pop('blocks', [])
+	_shared.clear()
+	for block in blocks:
+		block.close()
+
+
+# Run one configuration against the shared arrays and summarise it in one row
+def _run_one(task):
+
+	i, config = task
+	arrays = _shared[config['ticker']]
+	start = np.searchsorted(arrays['dates'], pd.Timestamp(config['since']).value, side='right')
+	prices = arrays['open'][start:]
+	weights = _weightings[config['weighting']](arrays['fear_greed'][start:])
+
+	rows, n_buys, ret = dca_arrays(prices, weights, config['dollar'], config['freq_d'], config['amount'])
+
+	result = dict(config, buys=n_buys, spent=0., crypto_tot=0., dollar_left=float(config['amount']), avg_price=np.nan, portfolio_value=float(config['amount']))
+	if len(rows):
+		result['spent'] = float(ret['dollar_spend_tot'][-1])
+		result['crypto_tot'] = float(ret['crypto_tot'][-1])
+		result['dollar_left'] = float(ret['dollar_left'][-1])
+		result['avg_price'] = result['spent'] / result['crypto_tot'] if result['crypto_tot'] else np.nan
+		result['portfolio_value'] = result['crypto_tot'] * ret['price'][-1] + result['dollar_left']
+		result['end_date'] = pd.Timestamp(arrays['dates'][start + rows[-1]])
+
+	return i, result
+
+
+"""
+Run every backtest configuration in grid over a process pool
+Each configuration is a dict with ticker, weighting (name in backtest.weightings or custom_weightings),
+freq_d, dollar, amount and since. Returns one row per configuration in grid order
+"""
+def sweep(data, grid, processes=None, chunksize=64, custom_weightings=None, progress_every=2):
+
+	tasks = list(enumerate(grid))
+	results = [None] * len(tasks)
+	blocks, specs = share_data(data)
+
+	pool = None
+	t0 = last_print = time.time()
+	try:
+		if processes == 1:
+			_init_worker(specs, custom_weightings)
+			outputs = map(_run_one, tasks)
+		else:
+			pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(specs, custom_weightings))
+			outputs = pool.imap_unordered(_run_one, tasks, chunksize=chunksize)
+
+		for done, (i, result) in enumerate(outputs, 1):
+			results[i] = result
+			if time.time() - last_print > progress_every:
+				last_print = time.time()
+				print('Sweep: %d/%d runs  %.0f runs/s' % (done, len(tasks), done / (last_print - t0)))
+
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+		else:
+			_close_worker()
+		for block in blocks:
+			block.close()
+			block.unlink()
+
+	elapsed = time.time() - t0
+	print('Sweep finished: %d runs in %.2fs  %.0f runs/s' % (len(tasks), elapsed, len(tasks) / max(elapsed, 1e-9)))
+
+	return pd.DataFrame(results)
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from save import json_default
+from metrics import metrics
+
+
+"""
+Append-only journal of trades as JSON lines split into numbered segment files
+Appends are buffered and written with one fsync per batch, a segment is closed once it is larger than segment_size
+journal_index.json records which coins and times every segment holds so a coin's history only scans its segments
+"""
+class TradeJournal:
+
+	def __init__(self, root='prev_trades', segment_size=16*1024*1024, batch=64, flush_every=1.0):
+		self.root = root
+		self.segment_size = segment_size
+		self.batch = batch
+		self.flush_every = flush_every
+		self.buffer = []
+		self.lock = threading.Lock()
+		self.write_lock = threading.Lock()
+		self.flush_event = threading.Event()
+		self.flusher = None
+		self.index = None # {segment file: {'size':bytes, 'coins':{coin: {'count', 'first', 'last'}}}}
+
+
+	"""
+	Add a trade to the journal, it is written within flush_every seconds or once batch trades are waiting
+	"""
+	def append(self, trade, coin, mode):
+
+		now = time.time()
+		line = json.dumps({'time':now, 'coin':coin, 'mode':mode, 'trade':trade}, default=json_default) + '\n'
+		with self.lock:
+			self.buffer.append((line, coin, now))
+			full = len(self.buffer) >= self.batch
+			if self.flusher is None:
+				self.flusher = threading.Thread(target=self._flush_loop, name='trade_journal', daemon=True)
+				self.flusher.start()
+		if full:
+			self.flush_event.set()
+
+
+	"""
+	Write the buffered trades to the current segment and fsync it
+	"""
+	def flush(self):
+
+		with self.write_lock:
+			with self.lock:
+				lines, self.buffer = self.buffer, []
+			if not lines:
+				return
+
+			start = time.perf_counter()
+			self._load_index()
+			os.makedirs(self.root, exist_ok=True)
+			segment = self._current_segment()
+			entry = self.index.setdefault(segment, {'size':0, 'coins':{}})
+			with open(os.path.join(self.root, segment), 'ab') as journal_file:
+				# Drop anything after the last complete line from a write that was cut off
+				journal_file.truncate(entry['size'])
+				journal_file.write(''.join(line for line, _, _ in lines).encode())
+				journal_file.flush()
+				os.fsync(journal_file.fileno())
+				size = journal_file.tell()
+
+			entry['size'] = size
+			for _, coin, t in lines:
+				self._index_trade(entry, coin, t)
+			self._write_index()
+			metrics.observe('journal_flush_seconds', time.perf_counter() - start)
+
+
+	def close(self):
+		self.flush()
+
+
+	"""
+	Trades in time order as {'time', 'coin', 'mode', 'trade'} optionally for one coin between since and until (unix seconds)
+	"""
+	def read(self, coin=None, since=None, until=None):
+
+		self.flush()
+		with self.write_lock:
+			self._load_index()
+			segments = sorted(self.index.items())
+
+		for segment, entry in segments:
+			if coin is not None and coin not in entry['coins']:
+				continue
+			stats = [entry['coins'][coin]] if coin is not None else list(entry['coins'].values())
+			if not stats:
+				continue
+			if since is not None and max(s['last'] for s in stats) < since:
+				continue
+			if until is not None and min(s['first'] for s in stats) > until:
+				continue
+
+			with open(os.path.join(self.root, segment), 'r') as journal_file:
+				for line in journal_file:
+					if coin is not None and '"coin": "%s"' % coin not in line:
+						continue
+					record = json.loads(line)
+					if (coin is None or record['coin'] == coin) and (since is None or record['time'] >= since) and (until is None or record['time'] <= until):
+						yield record
+
+
+	"""
+	Move the one file per trade logs written by older versions (dca_<date>_<coin>_<sim/live>.json) into the journal
+	"""
+	def import_files(self, remove=False):
+
+		files = sorted(f for f in os.listdir(self.root) if f.startswith('dca_') and f.endswith('.json')) if os.path.isdir(self.root) else []
+		for file_name in files:
+			parts = file_name[:-5].split('_')
+			t = datetime.strptime('_'.join(parts[1:6]), '%y_%m_%d-%H_%M_%S').timestamp()
+			with open(os.path.join(self.root, file_name), 'r') as json_file:
+				trade = json.load(json_file)
+			line = json.dumps({'time':t, 'coin':parts[6], 'mode':parts[7], 'trade':trade}, default=json_default) + '\n'
+			with self.lock:
+				self.buffer.append((line, parts[6], t))
+		self.flush()
+
+		if remove:
+			for file_name in files:
+				os.remove(os.path.join(self.root, file_name))
+		return len(files)
+
+
+	# Flush on a timer in the background
+	def _flush_loop(self):
+		while 1:
+			self.flush_event.wait(self.flush_every)
+			self.flush_event.clear()
+			try:
+				self.flush()
+			except Exception as e:
+				print('Error writing trade journal: %s' % e)
+				metrics.inc('errors_total', where='journal')
+
+
+	# Segment to append to, a new one once the last is full
+	def _current_segment(self):
+		segments = sorted(self.index)
+		if segments and self.index[segments[-1]]['size'] < self.segment_size:
+			return segments[-1]
+		return 'journal_%06d.jsonl' % (len(segments) + 1)
+
+
+	def _index_trade(self, entry, coin, t):
+		stats = entry['coins'].setdefault(coin, {'count':0, 'first':t, 'last':t})
+		stats['count'] += 1
+		stats['first'] = min(stats['first'], t)
+		stats['last'] = max(stats['last'], t)
+
+
+	# Read the index and rescan any segment that grew after the index was last written
+	def _load_index(self):
+		if self.index is not None:
+			return
+		try:
+			with open(os.path.join(self.root, 'journal_index.json'), 'r') as json_file:
+				self.index = json.load(json_file)
+		except (FileNotFoundError, ValueError):
+			self.index = {}
+
+		segments = sorted(f for f in os.listdir(self.root) if f.startswith('journal_') and f.endswith('.jsonl')) if os.path.isdir(self.root) else []
+		stale = [s for s in segments if s not in self.index or self.index[s]['size'] != os.path.getsize(os.path.join(self.root, s))]
+		for segment in stale:
+			entry = self.index[segment] = {'size':0, 'coins':{}}
+			with open(os.path.join(self.root, segment), 'rb') as journal_file:
+				for line in journal_file:
+					if not line.endswith(b'\n'):
+						break
+					record = json.loads(line)
+					self._index_trade(entry, record['coin'], record['time'])
+					entry['size'] += len(line)
+		if stale:
+			self._write_index()
+
+
+	def _write_index(self):
+		path = os.path.join(self.root, 'journal_index.json')
+		with open(path + '.tmp', 'w') as json_file:
+			json.dump(self.index, json_file)
+		os.replace(path + '.tmp', path)